@@ -40,5 +40,5 @@ setup(
 
 	entry_points = {"console_scripts": ["xuino = xuino.xuino:main"]},
 
-	package_data = {"xuino": ["makefiles/*.mk", "makefiles/*/*", "dependencies.json"]},
+	package_data = {"xuino": ["makefiles/*.mk", "makefiles/*/*", "host/*/*", "host/core/avr/*", "dependencies.json"]},
 )
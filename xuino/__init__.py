@@ -17,11 +17,31 @@ __all__ = [
 	"clean",
 	"list_boards",
 	"get_cflags",
+	"get_toolchain",
 	"get_src",
+	"find_library",
 	"get_obj",
 	"resolve_dependencies",
 	"get_lib",
+	"make_libraries",
+	"get_executor",
+	"LocalExecutor",
+	"RemoteExecutor",
+	"worker",
+	"select_objects",
+	"read_makefile_vars",
+	"read_project",
 	"make",
+	"make_workspace",
+	"tune",
+	"test",
+	"upload",
+	"read_ihex",
+	"stats",
+	"start_trace",
+	"finish_trace",
+	"cache_export",
+	"cache_import",
 	"config"
 ]
 
@@ -32,10 +52,30 @@ from .xuino import (
 	clean,
 	list_boards,
 	get_cflags,
+	get_toolchain,
 	get_src,
+	find_library,
 	get_obj,
 	resolve_dependencies,
 	get_lib,
+	make_libraries,
+	get_executor,
+	LocalExecutor,
+	RemoteExecutor,
+	worker,
+	select_objects,
+	read_makefile_vars,
+	read_project,
 	make,
+	make_workspace,
+	tune,
+	test,
+	upload,
+	read_ihex,
+	stats,
+	start_trace,
+	finish_trace,
+	cache_export,
+	cache_import,
 	config
 )
@@ -0,0 +1,18 @@
+#include "HardwareSerial.h"
+#include "xuino_mock.h"
+
+HardwareSerial Serial;
+
+void HardwareSerial::begin(unsigned long baud) { (void) baud; }
+void HardwareSerial::end() {}
+void HardwareSerial::flush() {}
+
+int HardwareSerial::available(void) { return xuino_mock_serial_available(); }
+int HardwareSerial::peek(void) { return xuino_mock_serial_peek(); }
+int HardwareSerial::read(void) { return xuino_mock_serial_read(); }
+
+size_t HardwareSerial::write(uint8_t c)
+{
+	xuino_mock_serial_write(c);
+	return 1;
+}
@@ -0,0 +1,22 @@
+#ifndef HardwareSerial_h
+#define HardwareSerial_h
+
+#include "Print.h"
+
+class HardwareSerial : public Print
+{
+public:
+	void begin(unsigned long baud);
+	void end();
+	int available(void);
+	int peek(void);
+	int read(void);
+	void flush(void);
+	virtual size_t write(uint8_t c);
+	using Print::write;
+	operator bool() { return true; }
+};
+
+extern HardwareSerial Serial;
+
+#endif
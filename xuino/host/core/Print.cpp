@@ -0,0 +1,105 @@
+#include <string.h>
+#include "Print.h"
+
+size_t Print::write(const char *str)
+{
+	if (str == NULL) return 0;
+	return write((const uint8_t *) str, strlen(str));
+}
+
+size_t Print::write(const uint8_t *buffer, size_t size)
+{
+	size_t n = 0;
+	while (size--) {
+		n += write(*buffer++);
+	}
+	return n;
+}
+
+size_t Print::print(const char str[]) { return write(str); }
+size_t Print::print(char c) { return write((uint8_t) c); }
+size_t Print::print(unsigned char n, int base) { return print((unsigned long) n, base); }
+size_t Print::print(int n, int base) { return print((long) n, base); }
+size_t Print::print(unsigned int n, int base) { return print((unsigned long) n, base); }
+
+size_t Print::print(long n, int base)
+{
+	if (base == 0) {
+		return write((uint8_t) n);
+	}
+	if (base == 10 && n < 0) {
+		return print('-') + printNumber((unsigned long) -n, 10);
+	}
+	return printNumber((unsigned long) n, base);
+}
+
+size_t Print::print(unsigned long n, int base)
+{
+	if (base == 0) return write((uint8_t) n);
+	return printNumber(n, base);
+}
+
+size_t Print::print(double n, int digits) { return printFloat(n, digits); }
+
+size_t Print::println(void) { return write("\r\n"); }
+size_t Print::println(const char str[]) { return print(str) + println(); }
+size_t Print::println(char c) { return print(c) + println(); }
+size_t Print::println(unsigned char n, int base) { return print(n, base) + println(); }
+size_t Print::println(int n, int base) { return print(n, base) + println(); }
+size_t Print::println(unsigned int n, int base) { return print(n, base) + println(); }
+size_t Print::println(long n, int base) { return print(n, base) + println(); }
+size_t Print::println(unsigned long n, int base) { return print(n, base) + println(); }
+size_t Print::println(double n, int digits) { return print(n, digits) + println(); }
+
+size_t Print::printNumber(unsigned long n, uint8_t base)
+{
+	char buf[8 * sizeof(long) + 1];
+	char *str = &buf[sizeof(buf) - 1];
+
+	*str = '\0';
+	if (base < 2) base = 10;
+
+	do {
+		unsigned long m = n;
+		n /= base;
+		char c = m - base * n;
+		*--str = c < 10 ? c + '0' : c + 'A' - 10;
+	} while (n);
+
+	return write(str);
+}
+
+size_t Print::printFloat(double number, uint8_t digits)
+{
+	size_t n = 0;
+
+	if (number != number) return print("nan");
+	if (number < 0.0) {
+		n += print('-');
+		number = -number;
+	}
+
+	// Round correctly so that print(1.999, 2) prints as "2.00"
+	double rounding = 0.5;
+	for (uint8_t i = 0; i < digits; ++i) {
+		rounding /= 10.0;
+	}
+	number += rounding;
+
+	unsigned long int_part = (unsigned long) number;
+	double remainder = number - (double) int_part;
+	n += print(int_part);
+
+	if (digits > 0) {
+		n += print('.');
+	}
+
+	while (digits-- > 0) {
+		remainder *= 10.0;
+		int to_print = int(remainder);
+		n += print(to_print);
+		remainder -= to_print;
+	}
+
+	return n;
+}
@@ -0,0 +1,25 @@
+/* Program memory is ordinary memory on the host. */
+#ifndef __PGMSPACE_H_
+#define __PGMSPACE_H_ 1
+
+#include <stdint.h>
+#include <string.h>
+
+#define PROGMEM
+#define PGM_P const char *
+#define PSTR(s) (s)
+
+#define pgm_read_byte(addr) (*(const uint8_t *)(addr))
+#define pgm_read_word(addr) (*(const uint16_t *)(addr))
+#define pgm_read_dword(addr) (*(const uint32_t *)(addr))
+#define pgm_read_float(addr) (*(const float *)(addr))
+#define pgm_read_ptr(addr) (*(void * const *)(addr))
+
+#define memcpy_P memcpy
+#define strcpy_P strcpy
+#define strncpy_P strncpy
+#define strcmp_P strcmp
+#define strncmp_P strncmp
+#define strlen_P strlen
+
+#endif
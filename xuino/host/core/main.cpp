@@ -0,0 +1,11 @@
+#include "Arduino.h"
+
+/* Only linked when nothing else defines main (test programs do) */
+int main(void)
+{
+	setup();
+	for (;;) {
+		loop();
+	}
+	return 0;
+}
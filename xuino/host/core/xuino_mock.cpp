@@ -0,0 +1,173 @@
+#include "Arduino.h"
+#include "xuino_mock.h"
+
+static uint8_t pin_modes[XUINO_MOCK_PINS];
+static int pin_values[XUINO_MOCK_PINS];
+static unsigned long long clock_micros;
+
+static char serial_output[XUINO_MOCK_SERIAL_SIZE];
+static size_t serial_output_len;
+static char serial_input[XUINO_MOCK_SERIAL_SIZE];
+static size_t serial_input_len;
+static size_t serial_input_pos;
+
+void xuino_mock_reset(void)
+{
+	memset(pin_modes, INPUT, sizeof(pin_modes));
+	memset(pin_values, 0, sizeof(pin_values));
+	clock_micros = 0;
+	xuino_mock_serial_clear();
+	serial_input_len = 0;
+	serial_input_pos = 0;
+	srand(0);
+}
+
+void xuino_mock_set_millis(unsigned long ms) { clock_micros = ms * 1000ULL; }
+void xuino_mock_advance_millis(unsigned long ms) { clock_micros += ms * 1000ULL; }
+void xuino_mock_advance_micros(unsigned long us) { clock_micros += us; }
+
+int xuino_mock_pin_mode(uint8_t pin) { return pin < XUINO_MOCK_PINS ? pin_modes[pin] : -1; }
+int xuino_mock_pin_value(uint8_t pin) { return pin < XUINO_MOCK_PINS ? pin_values[pin] : -1; }
+
+void xuino_mock_set_pin(uint8_t pin, int value)
+{
+	if (pin < XUINO_MOCK_PINS) pin_values[pin] = value;
+}
+
+const char *xuino_mock_serial_output(void) { return serial_output; }
+
+void xuino_mock_serial_clear(void)
+{
+	serial_output_len = 0;
+	serial_output[0] = '\0';
+}
+
+void xuino_mock_serial_input(const char *data)
+{
+	size_t len = strlen(data);
+	if (len > sizeof(serial_input) - serial_input_len) {
+		len = sizeof(serial_input) - serial_input_len;
+	}
+	memcpy(serial_input + serial_input_len, data, len);
+	serial_input_len += len;
+}
+
+void xuino_mock_serial_write(uint8_t c)
+{
+	if (serial_output_len < sizeof(serial_output) - 1) {
+		serial_output[serial_output_len++] = c;
+		serial_output[serial_output_len] = '\0';
+	}
+}
+
+int xuino_mock_serial_available(void) { return serial_input_len - serial_input_pos; }
+
+int xuino_mock_serial_peek(void)
+{
+	if (serial_input_pos == serial_input_len) return -1;
+	return (uint8_t) serial_input[serial_input_pos];
+}
+
+int xuino_mock_serial_read(void)
+{
+	int c = xuino_mock_serial_peek();
+	if (c != -1) serial_input_pos++;
+	return c;
+}
+
+/* The Arduino API */
+
+void pinMode(uint8_t pin, uint8_t mode)
+{
+	if (pin >= XUINO_MOCK_PINS) return;
+	pin_modes[pin] = mode;
+	if (mode == INPUT_PULLUP) pin_values[pin] = HIGH;
+}
+
+void digitalWrite(uint8_t pin, uint8_t value)
+{
+	if (pin < XUINO_MOCK_PINS) pin_values[pin] = value ? HIGH : LOW;
+}
+
+int digitalRead(uint8_t pin)
+{
+	if (pin >= XUINO_MOCK_PINS) return LOW;
+	return pin_values[pin] ? HIGH : LOW;
+}
+
+int analogRead(uint8_t pin) { return pin < XUINO_MOCK_PINS ? pin_values[pin] : 0; }
+void analogReference(uint8_t mode) { (void) mode; }
+
+void analogWrite(uint8_t pin, int value)
+{
+	if (pin < XUINO_MOCK_PINS) pin_values[pin] = value;
+}
+
+unsigned long millis(void) { return (unsigned long) (clock_micros / 1000); }
+unsigned long micros(void) { return (unsigned long) clock_micros; }
+void delay(unsigned long ms) { xuino_mock_advance_millis(ms); }
+void delayMicroseconds(unsigned int us) { xuino_mock_advance_micros(us); }
+
+unsigned long pulseIn(uint8_t pin, uint8_t state, unsigned long timeout)
+{
+	(void) pin; (void) state;
+	xuino_mock_advance_micros(timeout);
+	return 0;
+}
+
+void shiftOut(uint8_t dataPin, uint8_t clockPin, uint8_t bitOrder, uint8_t val)
+{
+	for (uint8_t i = 0; i < 8; i++) {
+		if (bitOrder == LSBFIRST) {
+			digitalWrite(dataPin, !!(val & (1 << i)));
+		} else {
+			digitalWrite(dataPin, !!(val & (1 << (7 - i))));
+		}
+		digitalWrite(clockPin, HIGH);
+		digitalWrite(clockPin, LOW);
+	}
+}
+
+uint8_t shiftIn(uint8_t dataPin, uint8_t clockPin, uint8_t bitOrder)
+{
+	uint8_t value = 0;
+	for (uint8_t i = 0; i < 8; i++) {
+		digitalWrite(clockPin, HIGH);
+		if (bitOrder == LSBFIRST) {
+			value |= digitalRead(dataPin) << i;
+		} else {
+			value |= digitalRead(dataPin) << (7 - i);
+		}
+		digitalWrite(clockPin, LOW);
+	}
+	return value;
+}
+
+void attachInterrupt(uint8_t interrupt, void (*handler)(void), int mode)
+{
+	(void) interrupt; (void) handler; (void) mode;
+}
+
+void detachInterrupt(uint8_t interrupt) { (void) interrupt; }
+
+long random(long howbig)
+{
+	if (howbig == 0) return 0;
+	return rand() % howbig;
+}
+
+long random(long howsmall, long howbig)
+{
+	if (howsmall >= howbig) return howsmall;
+	return random(howbig - howsmall) + howsmall;
+}
+
+void randomSeed(unsigned long seed)
+{
+	if (seed != 0) srand(seed);
+}
+
+long map(long x, long in_min, long in_max, long out_min, long out_max)
+{
+	return (x - in_min) * (out_max - out_min) / (in_max - in_min) + out_min;
+}
@@ -0,0 +1,47 @@
+/* Functions for inspecting and driving the mock hardware from tests.
+ *
+ * The clock only moves when delay(), delayMicroseconds() or one of the
+ * xuino_mock_advance functions is called, so tests run instantly and
+ * deterministically.
+ */
+#ifndef xuino_mock_h
+#define xuino_mock_h
+
+#include <stdint.h>
+
+#define XUINO_MOCK_PINS 70
+#define XUINO_MOCK_SERIAL_SIZE 4096
+
+#ifdef __cplusplus
+extern "C" {
+#endif
+
+/* Put every pin, the clock and the serial buffers back to their power-on state */
+void xuino_mock_reset(void);
+
+/* Time */
+void xuino_mock_set_millis(unsigned long ms);
+void xuino_mock_advance_millis(unsigned long ms);
+void xuino_mock_advance_micros(unsigned long us);
+
+/* Pins: the mode set by pinMode and the last value written or set */
+int xuino_mock_pin_mode(uint8_t pin);
+int xuino_mock_pin_value(uint8_t pin);
+void xuino_mock_set_pin(uint8_t pin, int value);
+
+/* Serial: everything printed so far, and data waiting to be read */
+const char *xuino_mock_serial_output(void);
+void xuino_mock_serial_clear(void);
+void xuino_mock_serial_input(const char *data);
+
+/* Used by the mock HardwareSerial */
+void xuino_mock_serial_write(uint8_t c);
+int xuino_mock_serial_available(void);
+int xuino_mock_serial_peek(void);
+int xuino_mock_serial_read(void);
+
+#ifdef __cplusplus
+}
+#endif
+
+#endif
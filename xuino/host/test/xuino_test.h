@@ -0,0 +1,43 @@
+/* A minimal unit test harness for `xuino test'.
+ *
+ * Each test file in the project's test directory is linked with the project
+ * into its own program. The mock hardware is reset before every test.
+ *
+ *	#include <xuino_test.h>
+ *
+ *	TEST(led_turns_on)
+ *	{
+ *		setup();
+ *		loop();
+ *		ASSERT_EQ(xuino_mock_pin_value(13), HIGH);
+ *	}
+ */
+#ifndef xuino_test_h
+#define xuino_test_h
+
+#include <string.h>
+#include "Arduino.h"
+#include "xuino_mock.h"
+
+typedef void (*xuino_test_fn)(void);
+
+int xuino_test_register(const char *name, xuino_test_fn fn);
+void xuino_test_fail(const char *file, int line, const char *expression);
+
+#define TEST(name) \
+	static void xuino_test_##name(void); \
+	static int xuino_test_id_##name = xuino_test_register(#name, xuino_test_##name); \
+	static void xuino_test_##name(void)
+
+#define ASSERT(expression) do { \
+	if (!(expression)) { \
+		xuino_test_fail(__FILE__, __LINE__, #expression); \
+		return; \
+	} \
+} while (0)
+
+#define ASSERT_EQ(a, b) ASSERT((a) == (b))
+#define ASSERT_NE(a, b) ASSERT((a) != (b))
+#define ASSERT_STR_EQ(a, b) ASSERT(strcmp((a), (b)) == 0)
+
+#endif
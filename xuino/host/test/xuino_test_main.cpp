@@ -0,0 +1,53 @@
+#include <stdio.h>
+#include "xuino_test.h"
+
+#define XUINO_MAX_TESTS 512
+
+static const char *names[XUINO_MAX_TESTS];
+static xuino_test_fn functions[XUINO_MAX_TESTS];
+static int count = 0;
+static int failed = 0;
+
+int xuino_test_register(const char *name, xuino_test_fn fn)
+{
+	if (count < XUINO_MAX_TESTS) {
+		names[count] = name;
+		functions[count] = fn;
+	}
+	return count++;
+}
+
+void xuino_test_fail(const char *file, int line, const char *expression)
+{
+	printf("  %s:%d: assertion failed: %s\n", file, line, expression);
+	failed = 1;
+}
+
+/* Run every test, or only those whose names contain argv[1] */
+int main(int argc, char **argv)
+{
+	int run = 0;
+	int failures = 0;
+
+	if (count > XUINO_MAX_TESTS) {
+		printf("Too many tests (%d), the limit is %d\n", count, XUINO_MAX_TESTS);
+		return 2;
+	}
+
+	for (int i = 0; i < count; i++) {
+		if (argc > 1 && strstr(names[i], argv[1]) == NULL) {
+			continue;
+		}
+
+		xuino_mock_reset();
+		failed = 0;
+		functions[i]();
+
+		printf("%s %s\n", failed ? "FAIL" : "ok  ", names[i]);
+		failures += failed;
+		run++;
+	}
+
+	printf("%d tests, %d failed\n", run, failures);
+	return failures ? 1 : 0;
+}
@@ -5,9 +5,11 @@
 
 CC = avr-gcc
 CXX = avr-g++
+AR = avr-ar
 
 BOARD_C_FLAGS ?= $(shell xuino get cflags $(BOARD))
-C_FLAGS = $(BOARD_C_FLAGS) -Os -w -ffunction-sections -fdata-sections
+EXTRA_C_FLAGS ?=
+C_FLAGS = $(BOARD_C_FLAGS) -Os -w -ffunction-sections -fdata-sections $(EXTRA_C_FLAGS)
 
 SRC_DIRS ?= $(shell xuino get src $(LIBRARY) --board $(BOARD))
 INCLUDES ?= $(shell xuino get src $(LIBRARY) --board $(BOARD) -I)
@@ -21,7 +23,7 @@ LIBARCHIVE ?= lib$(shell echo $(LIBRARY) | tr '[:upper:]' '[:lower:]').a
 
 $(LIBARCHIVE): $(LIBOBJS)
 	@echo Creating $(LIBARCHIVE) archive.
-	@avr-ar rcs $@ $^
+	@$(AR) rcs $@ $^
 
 %.o: %.cpp
 	@echo Compiling $@
@@ -1,6 +1,7 @@
 # Makefile template for Arduino projects
 CC = avr-gcc
 CXX = avr-g++
+OBJCOPY = avr-objcopy
 
 PROJECT = {PROJECT}
 BOARD = {BOARD}
@@ -29,7 +30,7 @@ OBJECTS = $(PROJECT).o
 
 $(PROJECT).hex: $(PROJECT).elf
 	@echo Making $@
-	@avr-objcopy -O ihex $< $@
+	@$(OBJCOPY) -O ihex $< $@
 	@rm $<
 
 $(PROJECT).elf: $(OBJECTS)
@@ -0,0 +1,282 @@
+"""Wrapper for the compilers & tools that make runs on Xuino's behalf.
+
+Usage: python wrapper.py [--trace EVENTS_FILE] [--workers HOST:PORT,...] -- TOOL [ARGS...]
+
+With --trace, the tool's start time, duration and kind (compile, link,
+archive or objcopy) are appended to EVENTS_FILE as a line of JSON, which
+`xuino make --trace' collects into a Chrome trace.
+
+With --workers, compiles are preprocessed locally and the preprocessed
+source is sent to one of the given `xuino worker' processes, which sends
+back the object file. Anything that can't be compiled remotely, or any
+failure to reach a worker, falls back to running the tool locally.
+
+This file is run as a script rather than imported, so that starting it
+doesn't cost a full import of Xuino for every compiler call. Xuino imports
+it for the worker protocol functions.
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import socket
+import subprocess
+
+# The version of the worker protocol & the default port workers listen on
+protocol_version = 1
+default_port = 7160
+
+# The longest header a worker will accept, in bytes
+max_header = 1 << 20
+
+# Seconds to wait for a worker to accept a connection, and to compile
+connect_timeout = 2.0
+compile_timeout = 600.0
+
+# Flags that only affect preprocessing, with & without a separate value
+preprocessor_options = ["-I", "-D", "-U", "-include", "-imacros", "-isystem",
+						"-iquote", "-idirafter"]
+preprocessor_prefixes = ["-I", "-D", "-U", "-isystem", "-iquote", "-idirafter"]
+
+# Dependency generation happens during preprocessing, so these are only run locally
+dependency_options = ["-M", "-MM", "-MD", "-MMD", "-MF", "-MT", "-MQ", "-MP"]
+
+# The languages of source files, and of their preprocessed output
+source_languages = {".c": "c", ".cpp": "c++", ".cc": "c++", ".cxx": "c++"}
+preprocessed_languages = {"c": "cpp-output", "c++": "c++-cpp-output"}
+
+
+def send_message(stream, header, payload = b""):
+	"""Send a message: a line of JSON, followed by `payload', whose size it gives."""
+	header = dict(header, size = len(payload))
+	stream.write(json.dumps(header).encode() + b"\n")
+	stream.write(payload)
+	stream.flush()
+
+
+def receive_message(stream):
+	"""Receive a message sent by send_message, returning (header, payload).
+
+	ValueError is raised for malformed or truncated messages.
+	"""
+	line = stream.readline(max_header)
+	if not line.endswith(b"\n"):
+		raise ValueError("Truncated message header")
+
+	header = json.loads(line.decode())
+	if not isinstance(header, dict):
+		raise ValueError("Message header isn't an object")
+
+	size = header.get("size", 0)
+	payload = stream.read(size) if size > 0 else b""
+	if len(payload) != size:
+		raise ValueError("Truncated message payload")
+
+	return (header, payload)
+
+
+def connect(address, timeout = connect_timeout):
+	"""Connect to a worker at HOST:PORT, returning a socket."""
+	host, _, port = address.rpartition(":")
+	return socket.create_connection((host, int(port)), timeout = timeout)
+
+
+def ping_worker(address):
+	"""Return a worker's reply to a ping, or None if it can't be reached.
+
+	The reply gives the worker's number of compile slots and the version of each
+	of its compilers.
+	"""
+	try:
+		with connect(address) as sock, sock.makefile("rwb") as stream:
+			send_message(stream, {"type": "ping", "version": protocol_version})
+			header, _ = receive_message(stream)
+	except (OSError, ValueError):
+		return None
+
+	if header.get("version") != protocol_version:
+		return None
+	return header
+
+
+def split_compile(command):
+	"""Split a compile command into the parts needed to compile it remotely.
+
+	Returns a tuple of (preprocess command, compile flags, preprocessed language,
+	output file), or None if the command isn't a compile that can run remotely.
+	"""
+	args = command[1:]
+	if "-c" not in args:
+		return None
+
+	language = None
+	source = None
+	output = None
+	preprocess_flags = []
+	compile_flags = []
+
+	i = 0
+	while i < len(args):
+		arg = args[i]
+		value = args[i + 1] if i + 1 < len(args) else None
+
+		if arg in dependency_options:
+			return None
+		elif arg == "-c":
+			pass
+		elif arg == "-o":
+			output = value
+			i += 1
+		elif arg == "-x":
+			language = value
+			i += 1
+		elif arg in preprocessor_options:
+			preprocess_flags += [arg, value]
+			i += 1
+		elif any(arg.startswith(x) for x in preprocessor_prefixes):
+			preprocess_flags.append(arg)
+		elif arg.startswith("-"):
+			compile_flags.append(arg)
+		elif source is None:
+			source = arg
+		else:
+			return None
+		i += 1
+
+	if source is None or output is None:
+		return None
+
+	if language is None:
+		language = source_languages.get(os.path.splitext(source)[1])
+	if language not in preprocessed_languages:
+		return None
+
+	preprocess = [command[0], "-E", "-x", language] + preprocess_flags + compile_flags + [source]
+	return (preprocess, compile_flags, preprocessed_languages[language], output)
+
+
+def compile_remote(command, workers):
+	"""Compile on one of the workers, returning the compiler's exit code.
+
+	Returns None if the command should be run locally instead.
+	"""
+	parts = split_compile(command)
+	if parts is None:
+		return None
+	(preprocess, flags, language, output) = parts
+
+	result = subprocess.run(preprocess, stdout = subprocess.PIPE, stderr = subprocess.PIPE)
+	if result.returncode != 0:
+		sys.stderr.write(result.stderr.decode())
+		return result.returncode
+
+	request = {
+		"type": "compile",
+		"version": protocol_version,
+		"compiler": os.path.basename(command[0]),
+		"flags": flags,
+		"language": language
+	}
+
+	# Spread the load by trying the workers in a random order
+	workers = list(workers)
+	random.shuffle(workers)
+	for address in workers:
+		try:
+			with connect(address) as sock, sock.makefile("rwb") as stream:
+				sock.settimeout(compile_timeout)
+				send_message(stream, request, result.stdout)
+				reply, obj = receive_message(stream)
+		except (OSError, ValueError):
+			continue
+
+		# Requests the worker refuses are run locally
+		if "error" in reply:
+			return None
+
+		sys.stderr.write(reply.get("stderr", ""))
+		if reply.get("returncode") == 0:
+			with open(output, "wb") as f:
+				f.write(obj)
+		return reply.get("returncode", 1)
+
+	return None
+
+
+def classify(argv):
+	"""Return the kind of command & the name of the file it produces."""
+	tool = os.path.basename(argv[0])
+	args = argv[1:]
+
+	if tool.endswith("ar") and len(args) >= 2:
+		return ("archive", os.path.basename(args[1]))
+	if "objcopy" in tool and len(args) >= 1:
+		return ("objcopy", os.path.basename(args[-1]))
+
+	output = "a.out"
+	if "-o" in args and args.index("-o") + 1 < len(args):
+		output = os.path.basename(args[args.index("-o") + 1])
+
+	if "-c" in args:
+		return ("compile", output)
+	return ("link", output)
+
+
+def record(events_file, argv, start, end, remote):
+	"""Append a trace event for a finished command to the events file."""
+	(kind, name) = classify(argv)
+	event = {
+		"name": name + (" (remote)" if remote else ""),
+		"cat": kind,
+		"start": start,
+		"end": end,
+		"group": os.path.basename(os.getcwd())
+	}
+
+	# A single short write in append mode won't interleave with other processes
+	with open(events_file, "a") as f:
+		f.write(json.dumps(event) + "\n")
+
+
+def main(argv):
+	events_file = None
+	workers = []
+
+	# Parse our own options, up to the --
+	while len(argv) > 0 and argv[0] != "--":
+		option = argv.pop(0)
+		if option == "--trace" and len(argv) > 0:
+			events_file = argv.pop(0)
+		elif option == "--workers" and len(argv) > 0:
+			workers = [x for x in argv.pop(0).split(",") if x != ""]
+		else:
+			print("wrapper.py: unknown option %s" % option, file = sys.stderr)
+			return 2
+
+	command = argv[1:]
+	if len(command) == 0:
+		print("wrapper.py: no command given", file = sys.stderr)
+		return 2
+
+	start = time.time()
+	returncode = None
+	if len(workers) > 0:
+		returncode = compile_remote(command, workers)
+
+	remote = returncode is not None
+	if not remote:
+		returncode = subprocess.call(command)
+	end = time.time()
+
+	if events_file is not None:
+		record(events_file, command, start, end, remote)
+
+	return returncode
+
+
+if __name__ == "__main__":
+	sys.exit(main(sys.argv[1:]))
+
+# vim: set noexpandtab tabstop=4 :
@@ -12,16 +12,36 @@ import io
 import sys
 import glob
 import json
+import time
 import shutil
+import hashlib
+import queue
+import sqlite3
+import tarfile
+import threading
+import shlex
 import argparse
+import itertools
+import tempfile
+import contextlib
 import subprocess
 import configparser
-import pkg_resources as pkg
+import socketserver
+
+from . import wrapper
+
+# The directory holding Xuino's makefiles & other data files.
+# Found directly rather than with pkg_resources, which takes longer to import
+# than a no-op `xuino make' takes to run.
+package_dir = os.path.dirname(os.path.abspath(__file__))
+
+def resource_path(name):
+	"""Return the path of one of Xuino's data files, given its path within the package."""
+	return os.path.join(package_dir, name)
 
 # Load Xuino's dependency map
-dependency_string = pkg.resource_string(__name__, "dependencies.json").decode()
-dependency_string = io.StringIO(dependency_string)
-dependency_map = json.load(dependency_string)
+with open(resource_path("dependencies.json"), "r") as dependency_file:
+	dependency_map = json.load(dependency_file)
 dependency_map = {lib: set(deps) for (lib, deps) in dependency_map.items()}
 
 # Global configuration object, initialised later
@@ -30,6 +50,73 @@ config = None
 # The math library's name
 math_library = "m"
 
+# The pseudo-board for compiling natively against a mock core, and its boards.txt entry
+host_board = "host"
+host_board_info = {	"name": "Host-native build against a mock core",
+					"build.mcu": "host",
+					"build.f_cpu": "16000000L",
+					"build.variant": "host"
+}
+
+# Compilers & binutils, for real boards and the host pseudo-board
+avr_toolchain = {"CC": "avr-gcc", "CXX": "avr-g++", "AR": "avr-ar", "OBJCOPY": "avr-objcopy"}
+host_toolchain = {"CC": "gcc", "CXX": "g++", "AR": "ar", "OBJCOPY": "objcopy"}
+
+# The build history database, stored in the compile root
+history_file = "history.sqlite"
+
+# The number of recent builds of each library & object kept in the build history
+history_limit = 50
+
+# How much slower than usual a build must be for `xuino stats' to flag it
+regression_threshold = 0.25
+
+# Compiler flags used by the makefile templates, which extra flags are added to
+default_cflags = "-Os -w -ffunction-sections -fdata-sections"
+
+# The flags tried by `xuino tune': every combination of one flag from each group
+tune_flag_groups = [
+	["", "-O2"],
+	["", "-mcall-prologues"],
+	["", "-flto"],
+	["", "-fno-inline-small-functions"]
+]
+
+# The extensions of project files scanned by select_objects
+project_exts = [".ino", ".c", ".cpp", ".h", ".hpp"]
+
+# Matches the file names in #include lines
+include_regex = re.compile(r'^\s*#\s*include\s*[<"]([^>"]+)[>"]', re.MULTILINE)
+
+# The directory of build stamps in the compile root, and their format version
+stamp_dir = "stamps"
+stamp_version = 1
+
+# Environment variables that change what a project build does
+stamp_environ = ["BOARD", "LIBRARIES", "PROJECT", "PATH"]
+
+# The file recording the extra flags of a board directory (see get_board_dir)
+board_flags_file = "cflags"
+
+# The compilers a worker runs
+worker_compilers = [avr_toolchain["CC"], avr_toolchain["CXX"],
+					host_toolchain["CC"], host_toolchain["CXX"]]
+
+# The compiler flags a worker accepts: code generation & warning options only,
+# with values that can't name a path (see worker_compile)
+worker_flag_regex = re.compile(r"^(-O(\w*)"
+								r"|-[mfW][A-Za-z0-9_+-]+(=[A-Za-z0-9_,+-]+)?"
+								r"|-g\w*"
+								r"|-std=[\w+]+"
+								r"|-D\w+(=\S*)?"
+								r"|-w|-pedantic|-pedantic-errors)$")
+
+# The upload ledger, stored in the compile root
+ledger_file = "uploads.json"
+
+# The trace being recorded, if any (see start_trace)
+trace = None
+
 # Track whether the code is being run as an executable
 running_standalone = False
 
@@ -57,7 +144,12 @@ def read_config():
 	defaults = {"xuino": {	"arduino_root": "/usr/share/arduino",
 							"arduino_ver": "",
 							"compile_root": "~/.xuino/",
-							"library_dirs": ""
+							"library_dirs": "",
+							"jobs": "",
+							"avrdude": "avrdude",
+							"executor": "local",
+							"workers": "",
+							"cflags": ""
 	}}
 
 	parser.read_dict(defaults)
@@ -86,6 +178,15 @@ def read_config():
 
 	config["library_dirs"] = library_dirs
 
+	# Remote workers are a space separated list of HOST:PORT addresses
+	config["workers"] = config["workers"].split()
+
+	# The maximum number of compiles to run at once, one per CPU by default
+	if config["jobs"] == "":
+		config["jobs"] = os.cpu_count() or 1
+	else:
+		config["jobs"] = int(config["jobs"])
+
 	# Figure out the Arduino library version
 	if config["arduino_ver"] == "":
 		config["arduino_ver"] = read_arduino_ver(config["arduino_root"])
@@ -117,22 +218,24 @@ def read_arduino_ver(arduino_root):
 		_error(m)
 
 
+def get_boards_path():
+	"""Return the path of boards.txt, as located by the module-level `config' object."""
+	if config["arduino_ver"] < 150:
+		filepath = "hardware/arduino/boards.txt"
+	else:
+		filepath = "hardware/arduino/avr/boards.txt"
+	return os.path.join(config["arduino_root"], filepath)
+
+
 def read_boards():
 	"""Parse boards.txt and return a dictionary.
 
 	The module-level `config' object is used to locate the file.
+	The host pseudo-board is added unless boards.txt defines a board with the same name.
 	"""
 	boards = {}
-	arduino_root = config['arduino_root']
-	arduino_ver = config['arduino_ver']
-
-	if arduino_ver < 150:
-		filepath = "hardware/arduino/boards.txt"
-	else:
-		filepath = "hardware/arduino/avr/boards.txt"
-	filepath = os.path.join(arduino_root, filepath)
 
-	with open(filepath, "r") as f:
+	with open(get_boards_path(), "r") as f:
 		for line in f:
 			if line[0] in "\n#":
 				continue
@@ -145,6 +248,9 @@ def read_boards():
 				boards[board] = {}
 			boards[board][property] = value
 
+	if host_board not in boards:
+		boards[host_board] = dict(host_board_info)
+
 	return boards
 
 
@@ -190,7 +296,8 @@ def _init(args):
 	libraries = input("Libraries: ")
 
 	# Inject everything into the makefile template
-	makefile = pkg.resource_string(__name__, "makefiles/Project.mk").decode()
+	with open(resource_path("makefiles/Project.mk"), "r") as f:
+		makefile = f.read()
 	makefile = makefile.replace("{PROJECT}", project)
 	makefile = makefile.replace("{BOARD}", board)
 	makefile = makefile.replace("{LIBRARIES}", libraries)
@@ -260,13 +367,34 @@ def get_cflags(board, boards):
 
 	The flags returned are of the form:
 		-mmcu=<mcu> -DF_CPU=<cpu freq> -DARDUINO=<version>
+
+	For the host pseudo-board -mmcu is replaced by -DXUINO_HOST.
 	"""
 	board_info = boards[board]
-	flags = "-mmcu=%(build.mcu)s -DF_CPU=%(build.f_cpu)s" % board_info
+	if board == host_board:
+		flags = "-DXUINO_HOST -DF_CPU=%(build.f_cpu)s" % board_info
+	else:
+		flags = "-mmcu=%(build.mcu)s -DF_CPU=%(build.f_cpu)s" % board_info
 	flags += " -DARDUINO=%s" % config["arduino_ver"]
 	return flags
 
 
+def get_toolchain(board, cflags = ""):
+	"""Get a dictionary of the compilers & tools (CC, CXX, AR, OBJCOPY) for a board.
+
+	If the extra `cflags' enable link time optimisation, gcc's archiver wrapper is
+	used so that archives index the LTO objects' symbols.
+	"""
+	if board == host_board:
+		toolchain = dict(host_toolchain)
+	else:
+		toolchain = dict(avr_toolchain)
+
+	if "-flto" in cflags.split():
+		toolchain["AR"] = toolchain["CC"] + "-ar"
+	return toolchain
+
+
 def _get_src(args):
 	"""Print a list of source directories for the requested libraries.
 
@@ -305,6 +433,7 @@ def get_src(libraries, variant):
 
 	If the core library is requested, `variant' is the type of
 	Arduino board to compile for. Most boards are just "standard".
+	The host pseudo-board's "host" variant selects Xuino's mock core.
 
 	An exception is thrown if the list contains non-existant libraries.
 	"""
@@ -313,6 +442,8 @@ def get_src(libraries, variant):
 
 	# Sub-function to get the core library
 	def get_core():
+		if variant == host_board_info["build.variant"]:
+			return [resource_path("host/core")]
 		core = os.path.join(root, "hardware/arduino/cores/arduino")
 		core_sub_dirs = glob.glob("%s/*/" % core)
 		var_dir = os.path.join(root, "hardware/arduino/variants/%s" % variant)
@@ -329,15 +460,8 @@ def get_src(libraries, variant):
 		if lib == math_library:
 			continue
 
-		# Look for the library in root/libraries/name and the user specified directories
-		potential_locations = [os.path.join(user_dir, lib) for user_dir in config["library_dirs"]]
-		potential_locations.append(os.path.join(root, "libraries", lib))
-
-		for lib_dir in potential_locations:
-			if os.path.isdir(lib_dir):
-				lib_main = lib_dir
-				break
-		else:
+		lib_main = find_library(lib)
+		if lib_main is None:
 			_error("No library found with name '%s'" % lib)
 
 		src_dirs.append(lib_main)
@@ -349,6 +473,20 @@ def get_src(libraries, variant):
 	return src_dirs
 
 
+def find_library(library):
+	"""Return the main source directory of a non-core library, or None if it can't be found.
+
+	The user specified library directories are searched before root/libraries.
+	"""
+	potential_locations = [os.path.join(user_dir, library) for user_dir in config["library_dirs"]]
+	potential_locations.append(os.path.join(config["arduino_root"], "libraries", library))
+
+	for lib_dir in potential_locations:
+		if os.path.isdir(lib_dir):
+			return lib_dir
+	return None
+
+
 def _get_obj(args):
 	"""Print the names of all the .o files for a given library."""
 	library = args.library
@@ -450,15 +588,23 @@ def _get_lib(args):
 
 	Dependencies *are* resolved.
 	"""
-	boards = read_boards()
-	board = args.board
-	libraries = args.libraries
+	if args.trace:
+		start_trace(args.trace)
 
-	# Resolve dependencies
-	libraries = resolve_dependencies(libraries)
+	try:
+		with trace_span("read boards.txt"):
+			boards = read_boards()
+		board = args.board
+		libraries = args.libraries
+
+		# Resolve dependencies
+		with trace_span("resolve dependencies"):
+			libraries = resolve_dependencies(libraries)
 
-	# Make the libraries
-	library_list, output = get_lib(libraries, board, boards)
+		# Make the libraries
+		library_list, output = get_lib(libraries, board, boards)
+	finally:
+		finish_trace(sys.stderr)
 
 	# Print make output if desired
 	if args.verbose:
@@ -483,28 +629,79 @@ def _get_lib(args):
 	print(library_string)
 
 
-def get_lib(libraries, board, boards):
+def get_lib(libraries, board, boards, objects = None, executor = None, cflags = None):
 	"""Return a list of directories containing compiled versions of the given libraries.
 
 	The output list is ordered identically to the input list. This preserves
 	dependency-related ordering, if there is any.
 
+	By default every object of each library is compiled. `objects' may be a
+	dictionary mapping library names to lists of objects, to only compile some
+	objects of those libraries (see select_objects). Archives are only ever added
+	to, so objects compiled for other projects remain available.
+
+	Compiles are run by `executor', or the one chosen by get_executor if None.
+
+	`cflags' are extra compiler flags, from get_extra_cflags by default. Libraries
+	built with different extra flags are kept apart (see get_board_dir).
+
 	This function itself does *not* resolve dependencies.
 	"""
+	library_list, output, failed = make_libraries(libraries, board, boards, objects,
+													executor, cflags)
+	if len(failed) > 0:
+		for lib in output:
+			print("-- Output from %s make command --" % lib)
+			print(output[lib])
+		_error("Fatal error, unable to compile all libraries.")
+
+	return (library_list, output)
+
+
+def make_libraries(libraries, board, boards, objects = None, executor = None, cflags = None):
+	"""Make libraries like get_lib, without quitting if any of them fail.
+
+	Returns a tuple of (library_list, output, failed), where `failed' is the
+	list of libraries that didn't compile.
+	"""
+	if executor is None:
+		executor = get_executor()
+	if cflags is None:
+		cflags = get_extra_cflags(board)
+	cflags = " ".join(cflags.split())
+
 	# Set up environment variables for each make instance
 	env = {lib: {"LIBRARY": lib} for lib in libraries}
 
-	# Set up a dictionary of make processes
-	makes = {}
+	# Set up a dictionary of make commands
+	commands = {}
 
 	# Set up a dictionary of compilation directories
-	compile_dirs = {lib: os.path.join(config["compile_root"], board, lib) for lib in libraries}
+	board_dir = get_board_dir(board, cflags)
+	write_board_flags(board_dir, cflags)
+	compile_dirs = {lib: os.path.join(board_dir, lib) for lib in libraries}
 
 	# Set up common arguments
-	cflags = get_cflags(board, boards)
+	board_cflags = get_cflags(board, boards)
 	variant = boards[board]["build.variant"]
 	all_src = get_src(libraries, variant)
+	toolchain = executor.wrap(get_toolchain(board, cflags))
+	toolchain_args = ["%s=%s" % (var, toolchain[var]) for var in sorted(toolchain)]
+
+	# Estimate build times from previous builds with the same flags & executor
+	history_key = os.path.basename(board_dir)
+	if isinstance(executor, RemoteExecutor):
+		history_key += " (remote)"
+	with trace_span("read build history"):
+		history = open_history()
+		estimates = get_build_estimates(history, history_key)
+	object_estimates = [estimates[x] for x in estimates if isinstance(x, tuple)]
+	if len(object_estimates) > 0:
+		default_estimate = sum(object_estimates) / len(object_estimates)
+	else:
+		default_estimate = 1.0
 
+	full_objects = {}
 	for lib in env:
 		# No need to make the math library
 		if lib == math_library:
@@ -512,12 +709,23 @@ def get_lib(libraries, board, boards):
 
 		# Set common variables
 		env[lib]["BOARD"] = board
-		env[lib]["BOARD_C_FLAGS"] = cflags
+		env[lib]["BOARD_C_FLAGS"] = board_cflags
+		env[lib]["EXTRA_C_FLAGS"] = cflags
 		env[lib]["PATH"] = os.environ["PATH"]
 
 		# Set library specific variables
-		lib_src = get_src([lib], variant)
-		lib_obj = get_obj(lib_src)
+		all_obj = get_obj(get_src([lib], variant))
+		full_objects[lib] = len(set(all_obj))
+		if objects is not None and lib in objects:
+			lib_obj = list(objects[lib])
+		else:
+			lib_obj = all_obj
+
+		# Put the slowest objects first, so they start first when make runs in parallel
+		obj_estimate = lambda obj: estimates.get((lib, obj), default_estimate)
+		lib_obj.sort(key = obj_estimate, reverse = True)
+		if lib not in estimates:
+			estimates[lib] = sum(obj_estimate(obj) for obj in lib_obj)
 
 		# XXX: Bit hackish; include all src directories when building...
 		env[lib]["SRC_DIRS"] = " ".join(all_src)
@@ -533,44 +741,315 @@ def get_lib(libraries, board, boards):
 
 		# Find the makefile to use
 		specialised_makefile = "makefiles/libraries/{:s}.mk".format(lib)
-		if pkg.resource_exists(__name__, specialised_makefile):
-			makefile = pkg.resource_filename(__name__, specialised_makefile)
+		if os.path.exists(resource_path(specialised_makefile)):
+			makefile = resource_path(specialised_makefile)
 		else:
-			makefile = pkg.resource_filename(__name__, "makefiles/Library.mk")
+			makefile = resource_path("makefiles/Library.mk")
+
+		commands[lib] = ["make", "-f", makefile] + toolchain_args
+
+	# Share the executor's slots between the makes that run at once
+	make_args = executor.make_args(max(1, min(executor.jobs, len(commands))))
+	for lib in commands:
+		commands[lib] += make_args
 
-		# Run make in a subprocess
-		make_args = ["make", "-f", makefile]
-		makes[lib] = subprocess.Popen(make_args, cwd = compile_dir, env = env[lib],
-						stdout = subprocess.PIPE, stderr = subprocess.PIPE)
+	# Object times are measured between make's output lines, so they're only
+	# meaningful when each make compiles one object at a time
+	serial = make_args == ["-j1"]
 
-	# Wait for make processes to finish and collect output
-	error = False
+	# The project can't link until every library is built, so the slowest
+	# library is the critical path. Start the slowest libraries first.
+	order = sorted(commands, key = lambda lib: estimates[lib], reverse = True)
+	with trace_span("make libraries"):
+		results = run_makes(order, commands, env, compile_dirs, executor.jobs)
+
+	with trace_span("record build history"):
+		record_build(history, history_key, results, full_objects, serial)
+		history.close()
+
+	# Collect output, in the same order as the libraries
+	failed = []
 	output = {}
-	for lib in makes:
-		returncode = makes[lib].wait()
-		stdout, stderr = makes[lib].communicate()
-		output[lib] = stdout.decode()
+	for lib in libraries:
+		if lib not in results:
+			continue
 
-		if returncode != 0:
-			error = True
-			output[lib] += stderr.decode()
+		returncode, stdout, stderr, duration, object_times = results[lib]
+		output[lib] = stdout
 
-	if error:
-		for lib in output:
-			print("-- Output from %s make command --" % lib)
-			print(output[lib])
-		_error("Fatal error, unable to compile all libraries.")
+		if returncode != 0:
+			failed.append(lib)
+			output[lib] += stderr
 
 	library_list = [compile_dirs[lib] for lib in libraries]
-	return (library_list, output)
+	return (library_list, output, failed)
+
+
+def get_extra_cflags(board):
+	"""Return the extra compiler flags from the config for building a board's code.
+
+	The cflags.<board> option is used if it's set (as by `xuino tune'). Otherwise
+	the cflags option applies to the AVR boards, but not to the host, where AVR
+	flags would break the native compiler.
+	"""
+	option = ("cflags." + board).lower()
+	if option in config:
+		return config[option]
+	if board == host_board:
+		return ""
+	return config["cflags"]
+
+
+def get_board_dir(board, cflags = ""):
+	"""Return the directory in the compile root for a board's libraries.
+
+	Libraries built with extra `cflags' go in a separate directory for each set
+	of flags, so that switching flags doesn't throw away other builds. The flags
+	are written to a file in the directory when it's made (see read_board_dirs).
+	"""
+	if cflags == "":
+		return os.path.join(config["compile_root"], board)
+
+	digest = hashlib.sha1(cflags.encode()).hexdigest()[:8]
+	return os.path.join(config["compile_root"], "%s-%s" % (board, digest))
+
+
+def write_board_flags(board_dir, cflags):
+	"""Record the extra flags that a board directory's libraries are built with."""
+	if cflags == "":
+		return
+	os.makedirs(board_dir, exist_ok = True)
+	with open(os.path.join(board_dir, board_flags_file), "w") as f:
+		f.write(cflags + "\n")
+
+
+def read_board_dirs(boards):
+	"""List the board directories in the compile root, as tuples of (name, board, cflags)."""
+	compile_root = config["compile_root"]
+	board_dirs = []
+	for name in sorted(os.listdir(compile_root)):
+		if not os.path.isdir(os.path.join(compile_root, name)):
+			continue
+		if name in boards:
+			board_dirs.append((name, name, ""))
+			continue
+
+		# Directories for extra flags are named after the board & a hash of the flags
+		try:
+			with open(os.path.join(compile_root, name, board_flags_file), "r") as f:
+				cflags = f.read().strip()
+		except OSError:
+			continue
+		board = name.rpartition("-")[0]
+		if board in boards and get_board_dir(board, cflags) == os.path.join(compile_root, name):
+			board_dirs.append((name, board, cflags))
+
+	return board_dirs
+
+
+def run_makes(order, commands, envs, cwds, jobs):
+	"""Run a set of make commands in parallel, at most `jobs' at a time.
+
+	All of the arguments except `jobs' are dictionaries with the same keys,
+	and commands are started in the order given by the `order' list.
+
+	Returns a dictionary mapping each key to a tuple of:
+		(returncode, stdout, stderr, duration, object_times)
+	where `object_times' maps object names to compile times, measured between
+	the "Compiling <object>" lines that the makefiles print. The times are only
+	accurate for makes that run one compile at a time (-j1).
+	"""
+	results = {}
+	finished = queue.Queue()
+
+	def watch(key, process, start):
+		# Whatever happens, record a result & wake up the main loop
+		try:
+			results[key] = collect(key, process, start)
+		except Exception as e:
+			process.kill()
+			process.wait()
+			results[key] = (1, "", "Xuino error while running make: %r\n" % e,
+							time.time() - start, {})
+		finally:
+			finished.put(key)
+
+	def collect(key, process, start):
+		# Read stderr in the background so neither pipe can fill up and block make
+		stderr = []
+		stderr_reader = threading.Thread(target = lambda: stderr.append(process.stderr.read()))
+		stderr_reader.start()
+
+		lines = []
+		object_times = {}
+		current_obj = None
+		for line in process.stdout:
+			now = time.time()
+			if current_obj is not None:
+				object_times[current_obj] = now - obj_start
+				current_obj = None
+
+			line = line.decode(errors = "replace")
+			lines.append(line)
+			if line.startswith("Compiling "):
+				current_obj = line.split()[1]
+				obj_start = now
+
+		returncode = process.wait()
+		now = time.time()
+		if current_obj is not None:
+			object_times[current_obj] = now - obj_start
+
+		stderr_reader.join()
+		trace_event("make %s" % key, "make", start, now, group = "make")
+		errors = stderr[0].decode(errors = "replace") if len(stderr) > 0 else ""
+		return (returncode, "".join(lines), errors, now - start, object_times)
+
+	pending = list(order)
+	running = 0
+	while len(pending) > 0 or running > 0:
+		while len(pending) > 0 and running < jobs:
+			key = pending.pop(0)
+			start = time.time()
+			process = subprocess.Popen(commands[key], cwd = cwds[key], env = envs[key],
+							stdout = subprocess.PIPE, stderr = subprocess.PIPE)
+			threading.Thread(target = watch, args = (key, process, start)).start()
+			running += 1
+
+		finished.get()
+		running -= 1
+
+	return results
+
+
+def open_history():
+	"""Open the build history database in config["compile_root"], creating it if need be.
+
+	Each row of the builds table records how long a library (with an empty unit)
+	or a single object within a library (unit = the object's name) took to build.
+	The board column holds the name of the board's directory in the compile root
+	(see get_board_dir), with " (remote)" added for builds by remote workers, so
+	that builds with different flags or executors are kept apart.
+	"""
+	os.makedirs(config["compile_root"], exist_ok = True)
+	path = os.path.join(config["compile_root"], history_file)
+	history = sqlite3.connect(path, timeout = 30)
+	history.execute("CREATE TABLE IF NOT EXISTS builds "
+					"(time REAL, board TEXT, library TEXT, unit TEXT, duration REAL)")
+	history.execute("CREATE INDEX IF NOT EXISTS builds_board ON builds (board, time)")
+	return history
+
+
+def get_build_estimates(history, board, samples = 3):
+	"""Estimate build times for a board's libraries & objects from their recent builds.
+
+	The returned dictionary is keyed by library name for whole libraries and by
+	(library, object) tuples for objects. Each value is the mean of the most
+	recent `samples' durations, in seconds.
+	"""
+	recent = {}
+	rows = history.execute("SELECT library, unit, duration FROM "
+							"(SELECT library, unit, duration, ROW_NUMBER() OVER "
+							"(PARTITION BY library, unit ORDER BY time DESC) AS n "
+							"FROM builds WHERE board = ?) WHERE n <= ?", (board, samples))
+	for (library, unit, duration) in rows:
+		key = library if unit == "" else (library, unit)
+		recent.setdefault(key, []).append(duration)
+
+	return {key: sum(durations) / len(durations) for (key, durations) in recent.items()}
+
+
+def record_build(history, board, results, full_objects, objects = True):
+	"""Add the durations from a set of run_makes results to the build history.
+
+	A library's duration is only recorded when its make compiled all of the
+	`full_objects[lib]' objects in a full build, so that incremental & partial
+	builds don't look like fast full builds. Object durations are only recorded
+	if `objects' is True, i.e. if the makes ran serially (see run_makes).
+	Failed builds are ignored. Only the most recent `history_limit' builds of
+	each library & object are kept.
+	"""
+	now = time.time()
+	rows = []
+	for lib in results:
+		returncode, stdout, stderr, duration, object_times = results[lib]
+		if returncode != 0:
+			continue
+
+		if len(object_times) >= full_objects.get(lib, 0) > 0:
+			rows.append((now, board, lib, "", duration))
+		if objects:
+			rows.extend((now, board, lib, obj, object_times[obj]) for obj in object_times)
 
+	if len(rows) == 0:
+		return
 
-def make(args = "unused"):
+	with history:
+		history.executemany("INSERT INTO builds VALUES (?, ?, ?, ?, ?)", rows)
+		history.execute("DELETE FROM builds WHERE rowid IN "
+						"(SELECT rowid FROM (SELECT rowid, ROW_NUMBER() OVER "
+						"(PARTITION BY library, unit ORDER BY time DESC) AS n "
+						"FROM builds WHERE board = ?) WHERE n > ?)", (board, history_limit))
+
+
+def read_makefile_vars(variables, makefile_path = "Makefile"):
+	"""Read the values of simple `NAME = value' assignments from a project Makefile.
+
+	Values from the shell environment take precedence over those in the Makefile.
+	A dictionary is returned, containing None for any variable that couldn't be found.
+	"""
+	values = {var: os.environ.get(var) for var in variables}
+	missing = [var for var in variables if values[var] is None]
+	if len(missing) == 0:
+		return values
+
+	regexes = {var: re.compile(r"^%s\s*=(?P<value>[^#]*).*$" % var) for var in missing}
+	with open(makefile_path, "r") as makefile:
+		for line in makefile:
+			for var in missing:
+				if values[var] is not None:
+					continue
+				match = regexes[var].match(line)
+				if match:
+					values[var] = match.group("value").strip()
+
+	return values
+
+
+def read_project(makefile_path = "Makefile"):
+	"""Return the board and list of libraries (without dependencies) for a project."""
+	values = read_makefile_vars(["BOARD", "LIBRARIES"], makefile_path)
+	if values["BOARD"] is None or values["LIBRARIES"] is None:
+		_error("Unable to extract BOARD & LIBRARIES from %s." % makefile_path)
+
+	return (values["BOARD"], values["LIBRARIES"].split())
+
+
+def _make(args):
+	if args.trace:
+		start_trace(args.trace)
+
+	try:
+		if args.workspace is not None:
+			if args.demand:
+				_error("--demand can't be used with --workspace.")
+			make_workspace(args.workspace)
+		else:
+			make(args.demand)
+	finally:
+		finish_trace()
+
+
+def make(demand = False):
 	"""Make the project in the current directory, using its Makefile.
 
 	This function "pre-fills" all xuino variables to avoid multiple calls and
 	provides more helpful diagnostic output than a plain `make`.
 
+	If `demand' is True, only the library objects that the project appears to
+	use are compiled (see select_objects). Objects are added if the link fails
+	with undefined references, falling back to full library builds if need be.
+
 	If you've altered your makefile drastically this isn't guaranteed to work.
 	"""
 	# Check for makefile existence
@@ -579,95 +1058,1576 @@ def make(args = "unused"):
 			"Run `xuino init` to get one."
 		_error(m)
 
-	# Attempt to get the BOARD & LIBRARIES variables from the shell environment
-	board = None
-	libraries = None
-	if "BOARD" in os.environ:
-		board = os.environ["BOARD"]
-	if "LIBRARIES" in os.environ:
-		libraries = os.environ["LIBRARIES"]
-
-	# Otherwise read them from the makefile
-	makefile = None
-	if board is None or libraries is None:
-		makefile = open("Makefile", "r")
-		board_regex = re.compile(r"^BOARD\s*=(?P<value>[^#]*).*$")
-		lib_regex = re.compile(r"^LIBRARIES\s*=(?P<value>[^#]*).*$")
-
-	while board is None or libraries is None:
-		line = makefile.readline()
-		if line == "":
-			_error("Unable to extract BOARDS & LIBRARIES from Makefile.")
-
-		if board is None:
-			match = board_regex.match(line)
-			if match:
-				board = match.group("value").strip()
-
-		if libraries is None:
-			match = lib_regex.match(line)
-			if match:
-				libraries = match.group("value").strip()
-
-	if makefile is not None:
-		makefile.close()
+	# Don't do anything at all if nothing has changed since the last build
+	with trace_span("check build stamp"):
+		if check_stamp(demand):
+			print("Nothing to do, the project is up to date.")
+			return
+
+	with trace_span("read Makefile"):
+		board, libraries = read_project()
 
 	# Read boards.txt
-	boards = read_boards()
+	with trace_span("read boards.txt"):
+		boards = read_boards()
 
 	# Check that the board is valid
 	if board not in boards:
 		_error("Board not found '{}'".format(board))
 
-	# Turn libraries into a list
-	libraries = libraries.split(" ")
+	# Resolve dependencies
+	with trace_span("resolve dependencies"):
+		libraries = resolve_dependencies(libraries)
 
-	# If libraries is empty, make it the empty list
-	if libraries == [""]:
-		libraries = []
+	variant = boards[board]["build.variant"]
 
-	# Resolve dependencies
-	libraries = resolve_dependencies(libraries)
+	# Stat the sources before making anything, so that edits made during the build
+	# are picked up by the next one
+	with trace_span("stat sources"):
+		stamp_inputs = get_stamp_inputs(libraries, variant)
+
+	with trace_span("choose executor"):
+		executor = get_executor()
+
+	# In demand mode, only compile the library objects that the project needs
+	objects = None
+	if demand:
+		with trace_span("select objects"):
+			objects = select_objects(get_project_sources(), libraries, variant)
+
+	while True:
+		# Make the libraries
+		print("Making libraries...")
+		with trace_span("get_lib"):
+			lib_dirs, output = get_lib(libraries, board, boards, objects, executor)
+
+		# Print make output, so the user knows what's going on
+		for lib in output:
+			print("-- Output from %s make command --" % lib)
+			print(output[lib])
+
+		# Make the actual project
+		make_args, env = get_project_make(board, boards, libraries, lib_dirs, executor)
+
+		# In demand mode, keep the errors to look for unresolved symbols
+		start = time.time()
+		if objects is None:
+			make = subprocess.Popen(make_args, env = env)
+			returncode = make.wait()
+			errors = ""
+		else:
+			make = subprocess.Popen(make_args, env = env, stderr = subprocess.PIPE)
+			errors = make.communicate()[1].decode()
+			returncode = make.returncode
+			print(errors, end = "")
+		trace_event("make project", "make", start, time.time(), group = "make")
+
+		if returncode == 0:
+			write_stamp(stamp_inputs, lib_dirs, demand)
+			print("Success!")
+			return
+
+		if objects is None or "undefined reference" not in errors:
+			_error("Oh no! Make failed :(")
+
+		# Add the objects defining the missing symbols, or give up & build everything
+		added = find_missing_objects(errors, objects, libraries, variant)
+		if len(added) > 0:
+			print("Adding objects for unresolved symbols: %s" % " ".join(added))
+		else:
+			print("Unable to find the unresolved symbols, making libraries in full.")
+			objects = None
+
+
+def find_projects(workspace):
+	"""Find the Xuino projects under a directory, returning a sorted list of their paths.
+
+	A project is a directory whose Makefile sets PROJECT, BOARD & LIBRARIES.
+	Hidden directories aren't searched.
+	"""
+	projects = []
+	for (path, dirs, files) in os.walk(workspace):
+		dirs[:] = sorted(x for x in dirs if not x.startswith("."))
+		if "Makefile" not in files:
+			continue
+
+		values = read_makefile_vars(["PROJECT", "BOARD", "LIBRARIES"],
+									os.path.join(path, "Makefile"))
+		if None not in values.values():
+			projects.append(os.path.normpath(path))
+
+	return sorted(projects)
+
+
+def make_workspace(workspace):
+	"""Make all of the projects under a directory at once.
+
+	The libraries the projects need are worked out first, and each library is
+	made once per board, for all of the projects that use it. The projects are
+	then made in parallel, apart from those that are up to date according to
+	their build stamps (see check_stamp), and a report of the results is printed.
+
+	The config in effect is the one read by Xuino when it started, so the
+	projects' own .xuino files aren't used.
+
+	Returns a dictionary mapping project paths to a (status, duration) tuple, where
+	status is one of "up to date", "made", "failed", "libraries failed" or
+	"bad board" (for boards missing from boards.txt). If any
+	projects fail, their output is printed & Xuino exits with an error.
+	"""
+	with trace_span("find projects"):
+		projects = find_projects(workspace)
+	if len(projects) == 0:
+		_error("No projects found in %s." % workspace)
+
+	boards = read_boards()
+
+	# Work out what each project needs, & which libraries each board needs
+	results = {}
+	project_boards = {}
+	project_libraries = {}
+	board_libraries = {}
+	with trace_span("resolve dependencies"):
+		for project in projects:
+			board, libraries = read_project(os.path.join(project, "Makefile"))
+			project_boards[project] = board
+			if board not in boards:
+				results[project] = ("bad board", 0.0)
+				continue
+
+			libraries = resolve_dependencies(libraries)
+			project_libraries[project] = libraries
+			board_libraries.setdefault(board, [])
+			board_libraries[board] += [x for x in libraries if x not in board_libraries[board]]
+
+	stamp_inputs = {}
+	pending = []
+	for project in projects:
+		if project in results:
+			continue
+
+		variant = boards[project_boards[project]]["build.variant"]
+		if check_stamp(project_dir = project):
+			results[project] = ("up to date", 0.0)
+		else:
+			stamp_inputs[project] = get_stamp_inputs(project_libraries[project], variant, project)
+			pending.append(project)
+
+	print("Found %d projects, %d to make." % (len(projects), len(pending)))
+
+	with trace_span("choose executor"):
+		executor = get_executor()
+
+	# Make each board's libraries, for the projects that need making
+	board_dirs = {}
+	failed_libraries = {}
+	for board in sorted(set(project_boards[x] for x in pending)):
+		libraries = [x for x in board_libraries[board]
+						if any(x in project_libraries[y] for y in pending)]
+		print("Making %d libraries for %s..." % (len(libraries), board))
+		with trace_span("make %s libraries" % board):
+			lib_dirs, output, failed = make_libraries(libraries, board, boards,
+														executor = executor)
+
+		board_dirs[board] = dict(zip(libraries, lib_dirs))
+		for lib in failed:
+			failed_libraries[(board, lib)] = output[lib]
+
+	# Skip the projects whose libraries failed
+	for project in list(pending):
+		board = project_boards[project]
+		if any((board, x) in failed_libraries for x in project_libraries[project]):
+			results[project] = ("libraries failed", 0.0)
+			pending.remove(project)
+
+	# Make the projects in parallel, in their own directories
+	commands = {}
+	envs = {}
+	project_lib_dirs = {}
+	makes = min(executor.jobs, max(1, len(pending)))
+	for project in pending:
+		board = project_boards[project]
+		libraries = project_libraries[project]
+		project_lib_dirs[project] = [board_dirs[board][x] for x in libraries]
+		commands[project], envs[project] = get_project_make(board, boards, libraries,
+										project_lib_dirs[project], executor, makes = makes)
+
+	print("Making %d projects..." % len(pending))
+	builds = run_makes(pending, commands, envs, {x: x for x in pending}, executor.jobs)
+
+	for project in pending:
+		returncode, stdout, stderr, duration, object_times = builds[project]
+		if returncode == 0:
+			write_stamp(stamp_inputs[project], project_lib_dirs[project], project_dir = project)
+			results[project] = ("made", duration)
+		else:
+			results[project] = ("failed", duration)
+
+	# Print the output of anything that failed, then the report
+	for ((board, lib), output) in sorted(failed_libraries.items()):
+		print("-- Output from %s make command (%s) --" % (lib, board))
+		print(output)
+	for project in pending:
+		if results[project][0] == "failed":
+			print("-- Output from %s make command --" % project)
+			print(builds[project][1] + builds[project][2])
+
+	print("%-16s %-8s %-10s %s" % ("Status", "Time", "Board", "Project"))
+	for project in projects:
+		status, duration = results[project]
+		duration = "%.1fs" % duration if status in ("made", "failed") else ""
+		print("%-16s %-8s %-10s %s" % (status, duration, project_boards[project], project))
+
+	counts = {}
+	for (status, duration) in results.values():
+		counts[status] = counts.get(status, 0) + 1
+	print(", ".join("%d %s" % (counts[x], x) for x in sorted(counts)))
+
+	if any(x not in ("made", "up to date") for x in counts):
+		_error("Oh no! Some projects failed to make :(")
+
+	return results
+
+
+def get_stamp_path(project_dir = "."):
+	"""Return the path of the build stamp for a project directory."""
+	digest = hashlib.sha1(os.path.abspath(project_dir).encode()).hexdigest()
+	return os.path.join(config["compile_root"], stamp_dir, digest + ".json")
+
+
+def get_stamp_key(demand = False):
+	"""Return a hash of the settings besides files that a project build depends on."""
+	settings = {
+		"config": config,
+		"demand": demand,
+		"environ": {var: os.environ.get(var) for var in stamp_environ}
+	}
+	return hashlib.sha1(json.dumps(settings, sort_keys = True).encode()).hexdigest()
+
+
+def stat_files(paths):
+	"""Return a dictionary mapping paths to [modification time, size], or None if missing."""
+	stats = {}
+	for path in paths:
+		try:
+			info = os.stat(path)
+			stats[path] = [info.st_mtime_ns, info.st_size]
+		except OSError:
+			stats[path] = None
+	return stats
+
+
+def get_stamp_inputs(libraries, variant, project_dir = "."):
+	"""Stat the files that a build of a project reads.
+
+	These are the Makefile, the config files, boards.txt, the sources anywhere in
+	the project's tree and every file in the libraries' source directories. The
+	library directories are included too, so that adding or removing a file is
+	noticed (the project's directories are stat'd after the build by write_stamp).
+	"""
+	paths = [os.path.join(project_dir, "Makefile"), os.path.join(project_dir, ".xuino"),
+				os.path.expanduser("~/.xuinorc"), get_boards_path()]
+	paths += [x for x in walk_project(project_dir) if os.path.splitext(x)[1] in project_exts]
+	# Missing directories are recorded as missing, so that creating them is noticed
+	for src_dir in get_src(libraries, variant):
+		paths.append(src_dir)
+		if os.path.isdir(src_dir):
+			paths.extend(os.path.join(src_dir, name) for name in os.listdir(src_dir))
+
+	return stat_files(os.path.abspath(path) for path in paths)
+
+
+def walk_project(project_dir = "."):
+	"""Return the paths of every directory & file in a project's tree.
+
+	Hidden directories and the unit tests' build directory are skipped.
+	"""
+	test_build_dir = os.path.join(os.path.normpath(project_dir), "test", "build")
+	paths = []
+	for (path, dirs, files) in os.walk(project_dir):
+		dirs[:] = [x for x in dirs if not x.startswith(".") and
+					os.path.join(os.path.normpath(path), x) != test_build_dir]
+		paths.append(path)
+		paths.extend(os.path.join(path, x) for x in files)
+	return paths
+
+
+def write_stamp(inputs, lib_dirs, demand = False, project_dir = "."):
+	"""Write the build stamp for a project after a build.
+
+	`inputs' are the file stats from get_stamp_inputs, taken before the build. The
+	compiled library archives & the rest of the project's tree, including the
+	objects & .hex file, are added as they are after the build.
+	"""
+	paths = walk_project(project_dir)
+	for lib_dir in lib_dirs:
+		paths.extend(glob.glob(os.path.join(lib_dir, "*.a")))
+
+	files = stat_files(os.path.abspath(path) for path in paths)
+	files.update(inputs)
+
+	stamp = {"version": stamp_version, "key": get_stamp_key(demand), "files": files}
+	stamp_path = get_stamp_path(project_dir)
+	os.makedirs(os.path.dirname(stamp_path), exist_ok = True)
+	with open(stamp_path + ".tmp", "w") as f:
+		json.dump(stamp, f)
+	os.replace(stamp_path + ".tmp", stamp_path)
+
+
+def check_stamp(demand = False, project_dir = "."):
+	"""Return True if a project hasn't changed since its last build.
+
+	Only the build stamp & the files it lists are looked at, so this is quick:
+	nothing is parsed and no processes are started.
+	"""
+	try:
+		with open(get_stamp_path(project_dir), "r") as f:
+			stamp = json.load(f)
+	except (OSError, ValueError):
+		return False
 
+	if stamp.get("version") != stamp_version or stamp.get("key") != get_stamp_key(demand):
+		return False
 
-	# Get the compiler flags
-	cflags = get_cflags(board, boards)
+	files = stamp.get("files", {})
+	return stat_files(files) == files
+
+
+def get_project_make(board, boards, libraries, lib_dirs, executor, cflags = None,
+						source_dir = None, makes = 1):
+	"""Return the command & environment for making a project, once its libraries are made.
+
+	`lib_dirs' is the list of compiled library directories from get_lib, and
+	`cflags' are extra compiler flags (from get_extra_cflags by default).
+
+	Normally the command is run in the project's directory. If `source_dir' is
+	given, the Makefile & sources are taken from there instead, so that the
+	project can be made in another directory, without using any of the objects
+	built in `source_dir'. `makes' is the number of project
+	makes that will run at once, which share the executor's slots.
+	"""
+	if cflags is None:
+		cflags = get_extra_cflags(board)
+	cflags = " ".join(cflags.split())
 
 	# Get the source directories & header includes
 	variant = boards[board]["build.variant"]
 	src_dirs = get_src(libraries, variant)
+	if source_dir is not None:
+		src_dirs.insert(0, source_dir)
 	header_includes = "-I " + " -I ".join(src_dirs)
-	src_dirs = " ".join(src_dirs)
-
-	# Make the libraries
-	print("Making libraries...")
-	lib_dirs, output = get_lib(libraries, board, boards)
-
-	# Print make output, so the user knows what's going on
-	for lib in output:
-		print("-- Output from %s make command --" % lib)
-		print(output[lib])
 
 	# Create the full library include string
 	lib_includes = " -L " + " -L ".join(lib_dirs)
 	lib_names = [x.split("/")[-1].lower() for x in lib_dirs]
 	lib_includes += " -l" + " -l".join(lib_names)
 
-	# Make the actual project
-	env = { "BOARD_C_FLAGS": cflags,
-		"SRC_DIRS": src_dirs,
+	# The project's targets are also found on the VPATH, so with a separate source
+	# directory everything is remade (-B) rather than linking its stale objects
+	make_args = ["make"] + executor.make_args(makes)
+	if source_dir is not None:
+		make_args += ["-B", "-f", os.path.join(source_dir, "Makefile")]
+
+	# Host builds use the native toolchain, without any -mmcu flag.
+	# The toolchain is also set when the executor needs to wrap its tools.
+	if board == host_board or executor.wraps():
+		toolchain = executor.wrap(get_toolchain(board, cflags))
+		make_args += ["%s=%s" % (var, toolchain[var]) for var in sorted(toolchain)]
+
+	link_flags = None
+	if board == host_board:
+		link_flags = "-Wl,--gc-sections"
+		lib_includes += " -lstdc++ -lm"
+
+	# Extra flags are needed when linking too, for things like -flto
+	if cflags != "":
+		make_args.append("DEFAULT_C_FLAGS=%s %s" % (default_cflags, cflags))
+		if link_flags is None:
+			link_flags = "-mmcu=%s -Wl,--gc-sections" % boards[board]["build.mcu"]
+		link_flags += " " + cflags
+
+	if link_flags is not None:
+		make_args.append("LINK_FLAGS=" + link_flags)
+
+	env = { "BOARD_C_FLAGS": get_cflags(board, boards),
+		"SRC_DIRS": " ".join(src_dirs),
 		"HEADER_INCLUDES": header_includes,
 		"LIB_INCLUDES": lib_includes,
 		"PATH": os.environ["PATH"]
 	}
 	# XXX: Should we pass all of os.environ?
 
-	make = subprocess.Popen(["make"], env = env)
-	returncode = make.wait()
-	if returncode == 0:
-		print("Success!")
+	return (make_args, env)
+
+
+def get_project_sources(project_dir = "."):
+	"""Return the paths of the sketches, sources & headers in a project directory."""
+	sources = []
+	for ext in project_exts:
+		sources.extend(glob.glob(os.path.join(project_dir, "*" + ext)))
+	return sorted(sources)
+
+
+def select_objects(sources, libraries, variant):
+	"""Work out which objects of each library are needed by a project's sources.
+
+	A library source file is needed if a header with the same name is included by
+	the project, or by anything else that's needed. Includes are followed until
+	nothing new turns up. The core library is always built in full, so it isn't
+	included in the returned dictionary of library names to object lists.
+	"""
+	headers, lib_sources = _index_libraries(libraries, variant)
+	objects = {lib: [] for lib in libraries if lib not in ("core", math_library)}
+
+	seen = set(sources)
+	pending = list(sources)
+	while len(pending) > 0:
+		path = pending.pop()
+		for include in _read_includes(path):
+			for (lib, header) in headers.get(os.path.basename(include), []):
+				if header in seen:
+					continue
+				seen.add(header)
+				pending.append(header)
+
+				# Add the library sources that implement the header
+				stem = os.path.splitext(os.path.basename(header))[0]
+				for source in lib_sources.get((lib, stem), []):
+					if source not in seen:
+						seen.add(source)
+						pending.append(source)
+						objects[lib].append(_object_name(source))
+
+	return objects
+
+
+def find_missing_objects(errors, objects, libraries, variant):
+	"""Add the library objects that define the symbols listed as undefined by the linker.
+
+	`objects' is a dictionary of selected objects, as returned by select_objects,
+	which is updated in place. Candidate objects are found by searching the
+	unselected library sources for the symbols' names. A list of the added
+	objects is returned, which is empty if nothing could be found.
+	"""
+	patterns = []
+	for symbol in set(re.findall(r"undefined reference to [`'](.+?)'", errors)):
+		# References to a class's vtable mean its methods are missing
+		for prefix in ["vtable for ", "typeinfo for ", "VTT for "]:
+			if symbol.startswith(prefix):
+				symbol = symbol[len(prefix):] + "::"
+
+		name = symbol.split("(")[0].strip()
+		if name.endswith("::"):
+			patterns.append(re.compile(re.escape(name)))
+		else:
+			patterns.append(re.compile(r"\b%s\b" % re.escape(name)))
+
+	headers, lib_sources = _index_libraries(libraries, variant)
+	added = []
+	for (lib, stem) in sorted(lib_sources):
+		if lib not in objects:
+			continue
+
+		for source in lib_sources[(lib, stem)]:
+			obj = _object_name(source)
+			if obj in objects[lib]:
+				continue
+
+			with open(source, "r", errors = "replace") as f:
+				text = f.read()
+			if any(pattern.search(text) for pattern in patterns):
+				objects[lib].append(obj)
+				added.append(obj)
+
+	return added
+
+
+def _index_libraries(libraries, variant):
+	"""Index the files of the non-core libraries for select_objects.
+
+	Returns two dictionaries: header file names to lists of (library, path)
+	tuples, and (library, source name without extension) tuples to source paths.
+	"""
+	headers = {}
+	sources = {}
+	for lib in libraries:
+		if lib in ("core", math_library):
+			continue
+
+		for directory in get_src([lib], variant):
+			for path in sorted(glob.glob("%s/*" % directory)):
+				name = os.path.basename(path)
+				(stem, ext) = os.path.splitext(name)
+				if ext in [".h", ".hpp"]:
+					headers.setdefault(name, []).append((lib, path))
+				elif ext in [".c", ".cpp"]:
+					sources.setdefault((lib, stem), []).append(path)
+
+	return (headers, sources)
+
+
+def _read_includes(path):
+	"""Return the list of files #included by a source file."""
+	with open(path, "r", errors = "replace") as f:
+		return include_regex.findall(f.read())
+
+
+def _object_name(source):
+	"""Turn a source path into the name of its object file."""
+	return os.path.splitext(os.path.basename(source))[0] + ".o"
+
+
+def _test(args):
+	test(args.dir, args.filter, args.timeout)
+
+
+def test(test_dir = "test", name_filter = None, timeout = 60):
+	"""Build the project in the current directory for the host and run its unit tests.
+
+	Each .cpp file in `test_dir' is compiled into a separate test program, linked
+	with the project's own sources, Xuino's test harness & the host builds of the
+	project's libraries (see `host_board'). Objects and programs are kept in
+	`test_dir'/build. If `name_filter' is given, only the tests with names
+	containing it are run.
+	"""
+	# Check for makefile existence
+	if not os.path.isfile("Makefile"):
+		m = "No Makefile in the current directory.\n" \
+			"Run `xuino init` to get one."
+		_error(m)
+
+	test_files = sorted(glob.glob(os.path.join(test_dir, "*.cpp")))
+	if len(test_files) == 0:
+		_error("No tests found in %s" % os.path.abspath(test_dir))
+
+	# The project's board is ignored, tests always run on the host
+	board, libraries = read_project()
+	boards = read_boards()
+	libraries = resolve_dependencies(libraries)
+
+	print("Making libraries...")
+	lib_dirs, output = get_lib(libraries, host_board, boards)
+
+	# Set up flags for compiling and linking
+	variant = boards[host_board]["build.variant"]
+	harness_dir = resource_path("host/test")
+	include_dirs = [".", harness_dir] + get_src(libraries, variant)
+	cflags = get_cflags(host_board, boards).split() + ["-g", "-w"]
+	cflags += ["-I" + x for x in include_dirs]
+
+	lib_names = [x.split("/")[-1].lower() for x in lib_dirs]
+	link_flags = ["-L" + x for x in lib_dirs] + ["-l" + x for x in lib_names]
+
+	toolchain = get_toolchain(host_board)
+
+	build_dir = os.path.join(test_dir, "build")
+	os.makedirs(build_dir, exist_ok = True)
+
+	def compile(source):
+		"""Compile a single source file into the build directory, if it has changed."""
+		obj = os.path.join(build_dir, os.path.basename(source) + ".o")
+		dep_file = obj + ".d"
+		if not _needs_rebuild(obj, dep_file):
+			return obj
+
+		if source.endswith(".c"):
+			command = [toolchain["CC"]]
+		else:
+			command = [toolchain["CXX"], "-x", "c++"]
+		command += cflags + ["-MMD", "-MF", dep_file, "-c", "-o", obj, source]
+
+		print("Compiling %s" % source)
+		result = subprocess.run(command, stdout = subprocess.PIPE, stderr = subprocess.STDOUT)
+		if result.returncode != 0:
+			print(result.stdout.decode())
+			_error("Unable to compile %s" % source)
+		return obj
+
+	project_sources = sorted(glob.glob("*.ino") + glob.glob("*.cpp") + glob.glob("*.c"))
+	project_objects = [compile(x) for x in project_sources]
+	main_object = compile(os.path.join(harness_dir, "xuino_test_main.cpp"))
+
+	# Link & run one program per test file
+	failures = []
+	for test_file in test_files:
+		name = os.path.splitext(os.path.basename(test_file))[0]
+		program = os.path.join(build_dir, name)
+
+		objects = [compile(test_file)] + project_objects + [main_object]
+		command = [toolchain["CXX"], "-o", program] + objects + link_flags
+		result = subprocess.run(command, stdout = subprocess.PIPE, stderr = subprocess.STDOUT)
+		if result.returncode != 0:
+			print(result.stdout.decode())
+			_error("Unable to link %s" % program)
+
+		print("-- Running %s --" % name)
+		command = [program] if name_filter is None else [program, name_filter]
+		try:
+			result = subprocess.run(command, stdout = subprocess.PIPE,
+							stderr = subprocess.STDOUT, timeout = timeout)
+		except subprocess.TimeoutExpired as e:
+			print(e.output.decode() if e.output else "")
+			print("Timed out after %d seconds." % timeout)
+			failures.append(name)
+			continue
+
+		print(result.stdout.decode(), end = "")
+		if result.returncode != 0:
+			failures.append(name)
+
+	if len(failures) > 0:
+		_error("%d of %d test files failed: %s" % (len(failures), len(test_files),
+												" ".join(failures)))
+	print("All tests passed!")
+
+
+def _needs_rebuild(target, dep_file):
+	"""Check a target against the dependencies listed in a gcc -MMD dependency file."""
+	if not os.path.isfile(target) or not os.path.isfile(dep_file):
+		return True
+
+	with open(dep_file, "r") as f:
+		rule = f.read().replace("\\\n", " ")
+	dependencies = rule.split(":", 1)[-1].split()
+
+	target_mtime = os.path.getmtime(target)
+	for dep in dependencies:
+		if not os.path.exists(dep) or os.path.getmtime(dep) > target_mtime:
+			return True
+	return False
+
+
+def _tune(args):
+	tune(args.benchmark, not args.dry_run)
+
+
+def tune(benchmark = None, save = True):
+	"""Search for the compiler flags that make the smallest (or fastest) firmware.
+
+	The project in the current directory is made with every combination of the
+	flags in `tune_flag_groups', in parallel, each in its own temporary directory.
+	Libraries are cached separately for each set of flags (see get_board_dir), so
+	they're only compiled the first time a combination is tried. Builds bigger than
+	the board's upload.maximum_size are rejected.
+
+	If `benchmark' is given, it's run as a shell command for each build, with the
+	path of the .hex file in $XUINO_HEX. The number on the last line of its output
+	ranks the builds (lower is better), with ties broken by size. Otherwise the
+	smallest build wins.
+
+	If `save' is True, the best flags are written to the cflags.<board> option in
+	.xuino, which make uses for the board from then on. Returns the best flags (None if nothing worked).
+	"""
+	# Check for makefile existence
+	if not os.path.isfile("Makefile"):
+		m = "No Makefile in the current directory.\n" \
+			"Run `xuino init` to get one."
+		_error(m)
+
+	project = read_makefile_vars(["PROJECT"])["PROJECT"]
+	if project is None:
+		_error("Unable to extract PROJECT from Makefile.")
+
+	board, libraries = read_project()
+	boards = read_boards()
+	if board not in boards:
+		_error("Board not found '{}'".format(board))
+	libraries = resolve_dependencies(libraries)
+
+	max_size = boards[board].get("upload.maximum_size")
+	max_size = int(max_size) if max_size else None
+
+	executor = get_executor()
+	candidates = [" ".join(x for x in flags if x != "")
+					for flags in itertools.product(*tune_flag_groups)]
+	results = {flags: {"status": "", "size": None, "benchmark": None} for flags in candidates}
+
+	# Make the libraries for each set of flags (each make is parallel already)
+	lib_dirs = {}
+	for flags in candidates:
+		print("Making libraries with flags: %s" % (flags or "(default)"))
+		dirs, output, failed = make_libraries(libraries, board, boards,
+												executor = executor, cflags = flags)
+		if len(failed) == 0:
+			lib_dirs[flags] = dirs
+		else:
+			results[flags]["status"] = "libraries failed"
+
+	project_dir = os.getcwd()
+	with tempfile.TemporaryDirectory(prefix = "xuino-tune-") as tmp_dir:
+		# Make the project with each set of flags in parallel
+		commands = {}
+		envs = {}
+		build_dirs = {}
+		makes = min(executor.jobs, max(1, len(lib_dirs)))
+		for (i, flags) in enumerate(candidates):
+			if flags not in lib_dirs:
+				continue
+			build_dirs[flags] = os.path.join(tmp_dir, str(i))
+			os.mkdir(build_dirs[flags])
+			commands[flags], envs[flags] = get_project_make(board, boards, libraries,
+												lib_dirs[flags], executor, flags, project_dir, makes)
+
+		print("Making %s with %d sets of flags..." % (project, len(commands)))
+		builds = run_makes(list(commands), commands, envs, build_dirs, executor.jobs)
+
+		# Measure the builds, and benchmark those that fit (one at a time)
+		for flags in candidates:
+			if flags not in builds:
+				continue
+			if builds[flags][0] != 0:
+				results[flags]["status"] = "build failed"
+				continue
+
+			hex_path = os.path.join(build_dirs[flags], project + ".hex")
+			size = len(read_ihex(hex_path))
+			results[flags]["size"] = size
+			if max_size is not None and size > max_size:
+				results[flags]["status"] = "too big"
+				continue
+
+			if benchmark is not None:
+				score = run_benchmark(benchmark, hex_path)
+				if score is None:
+					results[flags]["status"] = "benchmark failed"
+					continue
+				results[flags]["benchmark"] = score
+
+			results[flags]["status"] = "ok"
+
+	# Rank the working builds
+	def rank(flags):
+		result = results[flags]
+		if benchmark is not None:
+			return (result["benchmark"], result["size"])
+		return (result["size"],)
+
+	working = sorted([x for x in candidates if results[x]["status"] == "ok"], key = rank)
+	failed = [x for x in candidates if results[x]["status"] != "ok"]
+
+	print("\n%-12s %-10s %-17s %s" % ("Size", "Benchmark", "Status", "Flags"))
+	for flags in working + failed:
+		result = results[flags]
+		size = "" if result["size"] is None else str(result["size"])
+		if max_size is not None and result["size"] is not None:
+			size += " (%d%%)" % (100 * result["size"] // max_size)
+		score = "" if result["benchmark"] is None else "%g" % result["benchmark"]
+		print("%-12s %-10s %-17s %s" % (size, score, result["status"], flags or "(default)"))
+
+	if len(working) == 0:
+		_error("None of the flag combinations worked.")
+
+	best = working[0]
+	print("\nBest flags: %s" % (best or "(default)"))
+	if save:
+		set_project_option("cflags." + board, best)
+		print("Saved to .xuino")
+	return best
+
+
+def run_benchmark(benchmark, hex_path):
+	"""Run a benchmark command for `xuino tune' & return its score, or None if it fails.
+
+	The command gets the path of the .hex file to test in $XUINO_HEX, and
+	the score is the number on the last line of its output.
+	"""
+	env = dict(os.environ, XUINO_HEX = hex_path)
+	result = subprocess.run(benchmark, shell = True, env = env, stdout = subprocess.PIPE)
+	lines = result.stdout.decode().strip().split("\n")
+	if result.returncode != 0:
+		return None
+
+	try:
+		return float(lines[-1].split()[-1])
+	except (ValueError, IndexError):
+		return None
+
+
+def set_project_option(option, value, path = ".xuino"):
+	"""Set an option in the [xuino] section of a project's config file.
+
+	Other lines, comments included, are left as they are.
+	"""
+	lines = []
+	if os.path.exists(path):
+		with open(path, "r") as f:
+			lines = f.readlines()
+	if len(lines) > 0 and not lines[-1].endswith("\n"):
+		lines[-1] += "\n"
+
+	option_regex = re.compile(r"^\s*%s\s*[=:]" % re.escape(option))
+	new_line = ("%s = %s" % (option, value)).rstrip() + "\n"
+
+	section = None
+	section_line = None
+	for (i, line) in enumerate(lines):
+		if line.strip().startswith("["):
+			section = line.strip()
+			if section == "[xuino]":
+				section_line = i
+		elif section == "[xuino]" and option_regex.match(line):
+			lines[i] = new_line
+			break
 	else:
-		_error("Oh no! Make failed :(")
+		if section_line is None:
+			lines += ["[xuino]\n", new_line]
+		else:
+			lines.insert(section_line + 1, new_line)
+
+	with open(path, "w") as f:
+		f.writelines(lines)
+
+
+def _stats(args):
+	stats(args.board, args.library, args.limit)
+
+
+def stats(board = None, library = None, limit = 10):
+	"""Print the recent build times of each library from the build history.
+
+	The latest build of each library is compared to the mean of its previous
+	builds (up to `limit' in total) and flagged if it's more than
+	`regression_threshold' slower. If a library is specified, the average
+	compile times of its slowest objects are also shown.
+	"""
+	history = open_history()
+
+	# Include the board's builds with extra flags or remote workers (see open_history)
+	board_filter = " AND (board = ? OR board LIKE ? OR board LIKE ?)"
+	board_params = [board, "%s-%%" % board, "%s %%" % board]
+
+	query = "SELECT board, library, duration FROM builds WHERE unit = ''"
+	params = []
+	if board is not None:
+		query += board_filter
+		params += board_params
+	if library is not None:
+		query += " AND library = ?"
+		params.append(library)
+	query += " ORDER BY time"
+
+	series = {}
+	for (row_board, row_library, duration) in history.execute(query, params):
+		series.setdefault((row_board, row_library), []).append(duration)
+
+	if len(series) == 0:
+		print("No build history yet.")
+		history.close()
+		return
+
+	print("%-22s %-16s %8s %8s %8s  %s" % ("Board", "Library", "Last", "Mean", "Change",
+										"Recent builds (seconds)"))
+	for key in sorted(series):
+		durations = series[key][-limit:]
+		last = durations[-1]
+		mean = sum(durations) / len(durations)
+
+		change = ""
+		flag = ""
+		if len(durations) > 1:
+			previous = sum(durations[:-1]) / len(durations[:-1])
+			if previous > 0:
+				ratio = (last - previous) / previous
+				change = "%+.0f%%" % (ratio * 100)
+				if ratio > regression_threshold:
+					flag = "  <- slower"
+
+		trend = " ".join("%.1f" % x for x in durations)
+		print("%-22s %-16s %8.2f %8.2f %8s  %s%s" % (key[0], key[1], last, mean,
+												change, trend, flag))
+
+	if library is not None:
+		query = "SELECT unit, AVG(duration), COUNT(*) FROM builds " \
+				"WHERE library = ? AND unit != ''"
+		params = [library]
+		if board is not None:
+			query += board_filter
+			params += board_params
+		query += " GROUP BY unit ORDER BY AVG(duration) DESC LIMIT 10"
+
+		print("\nSlowest objects in %s:" % library)
+		for (unit, duration, count) in history.execute(query, params):
+			print("%-30s %8.2f  (%d builds)" % (unit, duration, count))
+
+	history.close()
+
+
+def _upload(args):
+	upload(args.device, args.force, args.verify)
+
+
+def upload(devices = None, force = False, verify = False):
+	"""Upload the project in the current directory to one or more devices with avrdude.
+
+	The project must already have been made. Devices default to the Makefile's
+	USB_DEVICE. The upload ledger (see read_ledger) records a hash of the image
+	last flashed to each device, and devices that already have the project's
+	image for the same board are skipped, unless `force' is True.
+
+	With `verify', each device's flash is read back & hashed instead of relying on
+	the ledger, and only devices whose flash doesn't match are uploaded to.
+
+	The avrdude executable can be changed with the "avrdude" config option.
+	"""
+	values = read_makefile_vars(["PROJECT", "BOARD", "USB_DEVICE"])
+	if values["PROJECT"] is None or values["BOARD"] is None:
+		_error("Unable to extract PROJECT & BOARD from Makefile.")
+
+	board = values["BOARD"]
+	boards = read_boards()
+	if board not in boards or board == host_board:
+		_error("Can't upload to board '%s'" % board)
+
+	hex_path = values["PROJECT"] + ".hex"
+	if not os.path.isfile(hex_path):
+		_error("%s not found, run `xuino make` first." % hex_path)
+
+	image = read_ihex(hex_path)
+	image_hash = hashlib.sha1(image).hexdigest()
+
+	if not devices:
+		devices = [values["USB_DEVICE"] or "/dev/ttyUSB0"]
+
+	board_info = boards[board]
+	avrdude = [config["avrdude"], "-c", board_info["upload.protocol"],
+				"-p", board_info["build.mcu"], "-b", board_info["upload.speed"]]
+
+	ledger = read_ledger()
+	uploaded = []
+	skipped = []
+	failed = []
+	for device in devices:
+		entry = ledger.get(device, {})
+		in_ledger = entry.get("board") == board and entry.get("hash") == image_hash
+		if verify:
+			flash = read_flash(avrdude, device, len(image))
+			up_to_date = flash is not None and hashlib.sha1(flash).hexdigest() == image_hash
+		else:
+			up_to_date = in_ledger
+
+		if up_to_date and not force:
+			print("%s: up to date, skipping." % device)
+			skipped.append(device)
+
+			# Leave the ledger alone, unless a readback found an image it didn't know about
+			if in_ledger:
+				continue
+		else:
+			print("%s: uploading %s" % (device, hex_path))
+			command = avrdude + ["-P", device, "-U", "flash:w:%s:i" % hex_path]
+			if subprocess.call(command) != 0:
+				print("%s: upload failed." % device)
+				failed.append(device)
+				ledger.pop(device, None)
+				write_ledger(ledger)
+				continue
+			uploaded.append(device)
+
+		ledger[device] = {
+			"board": board,
+			"hash": image_hash,
+			"hex_file": os.path.abspath(hex_path),
+			"time": time.time()
+		}
+		write_ledger(ledger)
+
+	print("Uploaded %d, skipped %d, failed %d." % (len(uploaded), len(skipped), len(failed)))
+	if len(failed) > 0:
+		_error("Unable to upload to %s" % " ".join(failed))
+
+
+def read_ledger():
+	"""Read the upload ledger from config["compile_root"].
+
+	The ledger maps device names to the board, image hash, .hex file & time of
+	their last successful upload (or, if the image wasn't uploaded by Xuino, of
+	the `--verify' readback that found it on the device).
+	"""
+	path = os.path.join(config["compile_root"], ledger_file)
+	if not os.path.isfile(path):
+		return {}
+
+	with open(path, "r") as f:
+		try:
+			return json.load(f)
+		except ValueError:
+			return {}
+
+
+def write_ledger(ledger):
+	"""Replace the upload ledger, atomically so that concurrent readers never see half of it."""
+	os.makedirs(config["compile_root"], exist_ok = True)
+	path = os.path.join(config["compile_root"], ledger_file)
+	with open(path + ".tmp", "w") as f:
+		json.dump(ledger, f, indent = 1, sort_keys = True)
+	os.replace(path + ".tmp", path)
+
+
+def read_flash(avrdude, device, size):
+	"""Read the first `size' bytes of a device's flash, using the given avrdude command.
+
+	Returns None if avrdude fails.
+	"""
+	with tempfile.TemporaryDirectory(prefix = "xuino-") as tmp_dir:
+		readback = os.path.join(tmp_dir, "flash.hex")
+		command = avrdude + ["-P", device, "-U", "flash:r:%s:i" % readback]
+		if subprocess.call(command) != 0 or not os.path.isfile(readback):
+			return None
+		flash = read_ihex(readback)
+
+	# avrdude may leave off trailing erased (0xFF) bytes
+	flash = flash[:size]
+	return flash + b"\xff" * (size - len(flash))
+
+
+def read_ihex(path):
+	"""Return the binary image described by an Intel HEX file.
+
+	The image starts at address 0, and gaps are filled with 0xFF like erased flash.
+	"""
+	segments = []
+	base = 0
+	with open(path, "r") as f:
+		for (number, line) in enumerate(f, 1):
+			line = line.strip()
+			if line == "":
+				continue
+
+			try:
+				record = bytes.fromhex(line[1:]) if line[0] == ":" else b""
+			except ValueError:
+				record = b""
+			if len(record) < 5 or len(record) != record[0] + 5 or sum(record) & 0xFF != 0:
+				_error("Invalid record on line %d of %s" % (number, path))
+
+			address = (record[1] << 8) | record[2]
+			record_type = record[3]
+			payload = record[4:-1]
+
+			if record_type == 0:
+				segments.append((base + address, payload))
+			elif record_type == 1:
+				break
+			elif record_type == 2:
+				base = int.from_bytes(payload, "big") << 4
+			elif record_type == 4:
+				base = int.from_bytes(payload, "big") << 16
+
+	size = max([address + len(data) for (address, data) in segments] + [0])
+	image = bytearray(b"\xff" * size)
+	for (address, data) in segments:
+		image[address:address + len(data)] = data
+	return bytes(image)
+
+
+class LocalExecutor:
+	"""Runs compiles as local processes, up to `jobs' at a time.
+
+	Executors decide how many compiles run at once and how make runs the
+	compilers. Each make gets a share of the slots via make_args, and the
+	toolchain is wrapped with wrapper.py when tracing or compiling remotely.
+	"""
+	def __init__(self, jobs):
+		self.jobs = jobs
+
+	def wrapper_options(self):
+		"""Extra wrapper.py options for the compilers (CC & CXX)."""
+		return []
+
+	def wraps(self):
+		"""Check whether the toolchain needs wrapping."""
+		return trace is not None or len(self.wrapper_options()) > 0
+
+	def wrap(self, toolchain):
+		"""Return a copy of a toolchain dictionary, with its tools wrapped as need be."""
+		wrapper_path = resource_path("wrapper.py")
+		wrapped = {}
+		for var in toolchain:
+			options = []
+			if trace is not None:
+				options += ["--trace", trace["events_file"]]
+			if var in ["CC", "CXX"]:
+				options += self.wrapper_options()
+
+			if len(options) == 0:
+				wrapped[var] = toolchain[var]
+			else:
+				command = [sys.executable, wrapper_path] + options + ["--", toolchain[var]]
+				wrapped[var] = " ".join(shlex.quote(x) for x in command)
+		return wrapped
+
+	def make_args(self, makes = 1):
+		"""Return the -j argument for one of `makes' makes running at once."""
+		return ["-j%d" % max(1, self.jobs // makes)]
+
+
+class RemoteExecutor(LocalExecutor):
+	"""Sends compiles to `xuino worker' processes, see wrapper.py.
+
+	`workers' is a dictionary mapping HOST:PORT addresses to their number of
+	slots, which are added to the local slots. Preprocessing, linking and
+	anything the workers can't compile still happen locally.
+	"""
+	def __init__(self, jobs, workers):
+		LocalExecutor.__init__(self, jobs + sum(workers.values()))
+		self.workers = workers
+
+	def wrapper_options(self):
+		return ["--workers", ",".join(sorted(self.workers))]
+
+
+def get_executor():
+	"""Create the executor chosen by config["executor"], either "local" or "remote".
+
+	The remote executor uses the workers listed in config["workers"] that
+	respond, and falls back to local execution if none do.
+	"""
+	if config["executor"] == "local":
+		return LocalExecutor(config["jobs"])
+	if config["executor"] != "remote":
+		_error("Unknown executor '%s', expected local or remote." % config["executor"])
+
+	# Only use workers whose compilers are the same versions as ours, so that
+	# their objects can be linked with local ones
+	workers = {}
+	local_versions = {}
+	for address in config["workers"]:
+		reply = wrapper.ping_worker(address)
+		if reply is None or not reply.get("slots"):
+			continue
+
+		mismatched = []
+		for (compiler, version) in sorted(reply.get("compilers", {}).items()):
+			if compiler not in worker_compilers:
+				continue
+			if compiler not in local_versions:
+				local_versions[compiler] = get_compiler_version(compiler)
+			if local_versions[compiler] not in ("unknown", version):
+				mismatched.append(compiler)
+
+		if len(mismatched) > 0 or "compilers" not in reply:
+			print("Not using worker %s: compiler versions differ (%s)" %
+					(address, " ".join(mismatched) or "unknown"), file = sys.stderr)
+			continue
+		workers[address] = reply["slots"]
+
+	# Write to stderr, as `xuino get lib' output is read by makefiles
+	if len(workers) == 0:
+		print("No remote workers available, compiling locally.", file = sys.stderr)
+		return LocalExecutor(config["jobs"])
+
+	return RemoteExecutor(config["jobs"], workers)
+
+
+def _worker(args):
+	worker(args.bind, args.port, args.jobs)
+
+
+def worker(address = "127.0.0.1", port = wrapper.default_port, jobs = None):
+	"""Serve compile requests from remote executors until interrupted.
+
+	Each request holds a preprocessed translation unit, the compiler's name &
+	its flags, and is answered with the object file and the compiler's output.
+	Only Xuino's known compilers are run, and options that could load code or
+	touch other files are refused, but workers should still only be reachable
+	from trusted machines. At most `jobs' compiles (default config["jobs"])
+	run at once.
+	"""
+	if jobs is None:
+		jobs = config["jobs"]
+	slots = threading.Semaphore(jobs)
+
+	# Clients check these against their own compilers before sending any work
+	compilers = {x: get_compiler_version(x) for x in worker_compilers}
+
+	class Handler(socketserver.StreamRequestHandler):
+		def handle(self):
+			try:
+				header, payload = wrapper.receive_message(self.rfile)
+			except (OSError, ValueError):
+				return
+
+			if header.get("version") != wrapper.protocol_version:
+				reply, obj = ({"error": "unsupported protocol version"}, b"")
+			elif header.get("type") == "ping":
+				reply, obj = ({"slots": jobs, "version": wrapper.protocol_version,
+								"compilers": compilers}, b"")
+			elif header.get("type") == "compile":
+				with slots:
+					reply, obj = worker_compile(header, payload)
+			else:
+				reply, obj = ({"error": "unknown request type"}, b"")
+
+			try:
+				wrapper.send_message(self.wfile, reply, obj)
+			except OSError:
+				pass
+
+	class Server(socketserver.ThreadingTCPServer):
+		allow_reuse_address = True
+		daemon_threads = True
+
+	server = Server((address, port), Handler)
+	print("Worker listening on %s:%d with %d slots." % (address, port, jobs))
+	try:
+		server.serve_forever()
+	except KeyboardInterrupt:
+		pass
+	finally:
+		server.server_close()
+
+
+def worker_compile(request, source):
+	"""Compile a preprocessed translation unit for a worker.
+
+	Requests come over the network, so only the flags matched by worker_flag_regex
+	are accepted, & anything a flag makes the compiler write stays in a temporary
+	directory. Returns a (reply header, object file) tuple for the client.
+	"""
+	languages = wrapper.preprocessed_languages.values()
+
+	compiler = request.get("compiler")
+	language = request.get("language")
+	flags = request.get("flags")
+	if compiler not in worker_compilers or language not in languages or not isinstance(flags, list):
+		return ({"error": "invalid compile request"}, b"")
+	for flag in flags:
+		if not isinstance(flag, str) or not worker_flag_regex.match(flag) or \
+				flag.startswith("-fplugin"):
+			return ({"error": "refused flag %s" % flag}, b"")
+
+	with tempfile.TemporaryDirectory(prefix = "xuino-worker-") as tmp_dir:
+		source_path = os.path.join(tmp_dir, "unit.i")
+		obj_path = os.path.join(tmp_dir, "unit.o")
+		with open(source_path, "wb") as f:
+			f.write(source)
+
+		command = [compiler] + flags + ["-x", language, "-c", source_path, "-o", obj_path]
+		try:
+			result = subprocess.run(command, cwd = tmp_dir, stdout = subprocess.PIPE,
+								stderr = subprocess.STDOUT)
+		except OSError as e:
+			return ({"error": str(e)}, b"")
+
+		reply = {"returncode": result.returncode, "stderr": result.stdout.decode()}
+		obj = b""
+		if result.returncode == 0:
+			with open(obj_path, "rb") as f:
+				obj = f.read()
+
+	return (reply, obj)
+
+
+def start_trace(path):
+	"""Start recording a trace of the build, to be written to `path' by finish_trace.
+
+	Xuino's own phases are recorded with trace_span & trace_event. The tools run
+	by make are wrapped with wrapper.py (see LocalExecutor.wrap), which appends their
+	timings to a temporary events file.
+	"""
+	global trace
+	fd, events_file = tempfile.mkstemp(prefix = "xuino-trace-", suffix = ".jsonl")
+	os.close(fd)
+
+	trace = {"path": path, "events_file": events_file, "spans": [], "lock": threading.Lock()}
+	trace_event("read config", "phase", config_times[0], config_times[1])
+
+
+def trace_event(name, cat, start, end, group = "xuino"):
+	"""Add a span (with start & end times from time.time()) to the current trace, if any.
+
+	Spans with the same `group' are shown together. Those in the "xuino" group
+	(Xuino's own phases) must nest properly.
+	"""
+	if trace is None:
+		return
+
+	span = {"name": name, "cat": cat, "start": start, "end": end, "group": group}
+	with trace["lock"]:
+		trace["spans"].append(span)
+
+
+@contextlib.contextmanager
+def trace_span(name, cat = "phase", group = "xuino"):
+	"""Context manager that traces the time taken by its body."""
+	start = time.time()
+	try:
+		yield
+	finally:
+		trace_event(name, cat, start, time.time(), group)
+
+
+def finish_trace(summary_file = sys.stdout, slowest = 10):
+	"""Write the current trace in Chrome's trace event format & print a summary.
+
+	The trace can be viewed at chrome://tracing or https://ui.perfetto.dev
+	The summary lists the `slowest' longest running subprocesses.
+	"""
+	global trace
+	if trace is None:
+		return
+
+	spans = list(trace["spans"])
+	with open(trace["events_file"], "r") as f:
+		for line in f:
+			try:
+				spans.append(json.loads(line))
+			except ValueError:
+				pass
+	os.remove(trace["events_file"])
+
+	# Spread the spans of each group over as many rows (threads) as needed to avoid overlaps
+	origin = min(span["start"] for span in spans)
+	rows = {}
+	thread_ids = {("xuino", 0): 0}
+	events = []
+	for span in sorted(spans, key = lambda x: x["start"]):
+		group = span["group"]
+		ends = rows.setdefault(group, [])
+		if group == "xuino":
+			row = 0
+		else:
+			for row in range(len(ends) + 1):
+				if row == len(ends) or ends[row] <= span["start"]:
+					break
+		if row == len(ends):
+			ends.append(span["end"])
+		ends[row] = max(ends[row], span["end"])
+
+		if (group, row) not in thread_ids:
+			thread_ids[(group, row)] = len(thread_ids)
+
+		events.append({
+			"name": span["name"],
+			"cat": span["cat"],
+			"ph": "X",
+			"pid": 1,
+			"tid": thread_ids[(group, row)],
+			"ts": int((span["start"] - origin) * 1e6),
+			"dur": int((span["end"] - span["start"]) * 1e6)
+		})
+
+	for ((group, row), tid) in thread_ids.items():
+		name = group if row == 0 else "%s (%d)" % (group, row + 1)
+		events.append({"name": "thread_name", "ph": "M", "pid": 1, "tid": tid,
+						"args": {"name": name}})
+
+	with open(trace["path"], "w") as f:
+		json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+
+	# Summarise the slowest subprocesses
+	units = [span for span in spans if span["cat"] != "phase"]
+	units.sort(key = lambda x: x["end"] - x["start"], reverse = True)
+	print("Trace written to %s" % trace["path"], file = summary_file)
+	if len(units) > 0:
+		print("Slowest units:", file = summary_file)
+	for span in units[:slowest]:
+		print("%8.3fs  %-8s %-16s %s" % (span["end"] - span["start"], span["cat"],
+										span["group"], span["name"]), file = summary_file)
+
+	trace = None
+
+
+def hash_files(paths):
+	"""Return a hex digest of the names and contents of the given files, in order."""
+	digest = hashlib.sha1()
+	for path in paths:
+		digest.update(os.path.basename(path).encode())
+		with open(path, "rb") as f:
+			digest.update(f.read())
+	return digest.hexdigest()
+
+
+def get_source_hash(library, variant):
+	"""Return a hash of all the source & header files a library is compiled from.
+
+	Libraries are compiled against their dependencies' headers, so the hash
+	covers the directories of the library and all of its dependencies, core included.
+	"""
+	paths = []
+	for directory in get_src(resolve_dependencies([library]), variant):
+		files = glob.glob("%s/*" % directory)
+		paths.extend(sorted(x for x in files if os.path.isfile(x)))
+	return hash_files(paths)
+
+
+def get_board_fingerprint(board, boards, cflags = ""):
+	"""Return a hash of everything in boards.txt & the config that affects a board's code.
+
+	`cflags' are the extra compiler flags the libraries were built with.
+	"""
+	info = json.dumps(boards[board], sort_keys = True)
+	info += get_cflags(board, boards)
+	info += cflags
+	return hashlib.sha1(info.encode()).hexdigest()
+
+
+def get_toolchain_version(board):
+	"""Return the first line of `<CC> --version' for a board, or "unknown" if it can't be run."""
+	return get_compiler_version(get_toolchain(board)["CC"])
+
+
+def get_compiler_version(compiler):
+	"""Return the first line of `<compiler> --version', or "unknown" if it can't be run."""
+	try:
+		output = subprocess.check_output([compiler, "--version"], stderr = subprocess.DEVNULL)
+	except (OSError, subprocess.CalledProcessError):
+		return "unknown"
+	return output.decode().split("\n")[0].strip()
+
+
+def _cache_export(args):
+	cache_export(args.bundle)
+
+
+def cache_export(bundle_path):
+	"""Pack the compiled libraries in config["compile_root"] into a gzipped tar bundle.
+
+	The bundle contains a manifest describing, for each compiled library, the
+	toolchain version, board fingerprint, extra compiler flags and source hash it
+	was built from. Object files
+	are included alongside the archives so that make considers them up to date.
+	"""
+	boards = read_boards()
+	compile_root = config["compile_root"]
+
+	if not os.path.isdir(compile_root):
+		_error("Nothing to export, %s doesn't exist." % compile_root)
+
+	manifest = {
+		"format": 1,
+		"arduino_ver": config["arduino_ver"],
+		"entries": []
+	}
+
+	toolchains = {}
+	for (name, board, cflags) in read_board_dirs(boards):
+		board_dir = os.path.join(compile_root, name)
+		variant = boards[board]["build.variant"]
+		fingerprint = get_board_fingerprint(board, boards, cflags)
+		if board not in toolchains:
+			toolchains[board] = get_toolchain_version(board)
+		toolchain = toolchains[board]
+
+		for lib in sorted(os.listdir(board_dir)):
+			# Skip anything that isn't a complete library build
+			archive = "lib%s.a" % lib.lower()
+			lib_dir = os.path.join(board_dir, lib)
+			if not os.path.isfile(os.path.join(lib_dir, archive)):
+				continue
+			if lib != "core" and find_library(lib) is None:
+				continue
+
+			files = [x for x in os.listdir(lib_dir) if x.endswith(".o") or x == archive]
+			entry = {
+				"board": board,
+				"library": lib,
+				"toolchain": toolchain,
+				"fingerprint": fingerprint,
+				"cflags": cflags,
+				"sources": get_source_hash(lib, variant),
+				"files": ["%s/%s/%s" % (name, lib, x) for x in sorted(files)]
+			}
+			manifest["entries"].append(entry)
+
+	manifest_bytes = json.dumps(manifest, indent = 1).encode()
+	manifest_info = tarfile.TarInfo("manifest.json")
+	manifest_info.size = len(manifest_bytes)
+	manifest_info.mtime = time.time()
+
+	with tarfile.open(bundle_path, "w:gz") as bundle:
+		bundle.addfile(manifest_info, io.BytesIO(manifest_bytes))
+		for entry in manifest["entries"]:
+			for name in entry["files"]:
+				bundle.add(os.path.join(compile_root, name), arcname = name)
+
+	print("Exported %d libraries to %s" % (len(manifest["entries"]), bundle_path))
+
+
+def _cache_import(args):
+	cache_import(args.bundle)
+
+
+def cache_import(bundle_path):
+	"""Restore compatible libraries from a bundle created by cache_export.
+
+	An entry is only restored if the toolchain, board fingerprint and library
+	source hash all match the local installation. Restored files are touched so
+	that make treats them as newer than the (unchanged) sources.
+	"""
+	boards = read_boards()
+	compile_root = config["compile_root"]
+
+	try:
+		bundle = tarfile.open(bundle_path, "r:gz")
+	except (OSError, tarfile.TarError) as e:
+		_error("Unable to open bundle %s: %s" % (bundle_path, e))
+
+	with bundle:
+		try:
+			manifest = json.loads(bundle.extractfile("manifest.json").read().decode())
+		except (KeyError, ValueError):
+			_error("%s has no valid manifest, was it made by `xuino cache export`?" % bundle_path)
+
+		if manifest.get("format") != 1:
+			_error("Unsupported bundle format: %s" % manifest.get("format"))
+
+		# Check each entry against the local toolchain, boards & library sources
+		restore = []
+		toolchains = {}
+		for entry in manifest["entries"]:
+			board = entry["board"]
+			lib = entry["library"]
+			cflags = entry.get("cflags", "")
+			description = "%s (%s)" % (lib, board)
+			if cflags != "":
+				description = "%s (%s, %s)" % (lib, board, cflags)
+
+			if board not in boards:
+				print("Skipping %s: unknown board" % description)
+				continue
+			if board not in toolchains:
+				toolchains[board] = get_toolchain_version(board)
+			if entry["toolchain"] != toolchains[board]:
+				print("Skipping %s: toolchain differs (%s)" % (description, entry["toolchain"]))
+				continue
+			if entry["fingerprint"] != get_board_fingerprint(board, boards, cflags):
+				print("Skipping %s: board settings differ" % description)
+				continue
+			if lib != "core" and find_library(lib) is None:
+				print("Skipping %s: library not installed" % description)
+				continue
+			if entry["sources"] != get_source_hash(lib, boards[board]["build.variant"]):
+				print("Skipping %s: library sources differ" % description)
+				continue
+
+			restore.append(entry)
+
+		# Only extract the files listed by compatible entries, into their board's directory
+		names = set()
+		for entry in restore:
+			board_dir = get_board_dir(entry["board"], entry.get("cflags", ""))
+			prefix = os.path.relpath(board_dir, compile_root) + "/"
+			for name in entry["files"]:
+				if not name.startswith(prefix) or ".." in name.split("/"):
+					_error("Refusing to extract suspicious path %s" % name)
+				names.add(name)
+
+		members = [m for m in bundle.getmembers() if m.name in names and m.isfile()]
+		bundle.extractall(compile_root, members = members)
+
+	for entry in restore:
+		cflags = entry.get("cflags", "")
+		write_board_flags(get_board_dir(entry["board"], cflags), cflags)
+
+	# Touch the objects before the archives, so neither needs remaking
+	for entry in restore:
+		objects = [x for x in entry["files"] if x.endswith(".o")]
+		archives = [x for x in entry["files"] if not x.endswith(".o")]
+		for name in objects + archives:
+			os.utime(os.path.join(compile_root, name), None)
+
+	print("Restored %d of %d libraries." % (len(restore), len(manifest["entries"])))
 
 
 def _setup_argparser():
@@ -689,6 +2649,9 @@ def _setup_argparser():
 	h_clean = "Clear out the cache of compiled library code."
 	h_list = "List all available boards."
 	h_make = "Make the project in the current directory (verbosely)."
+	h_demand = "Only compile the library objects that the project uses."
+	h_workspace = "Make every project under this directory, sharing library builds."
+	h_trace = "Write a Chrome trace of the build's phases & compiler calls to this file."
 	h_get = "Get compiler flags, compiled libraries, etc."
 	h_gprop1 = "Get a board property from boards.txt"
 	h_gprop2 = "The name of the property as it appears in boards.txt\n" \
@@ -709,6 +2672,36 @@ def _setup_argparser():
 	h_dash_little_l = "Add a list of compiled archive names beginning with -l\n"\
 						"For example: -lethernet -lspi -lcore"
 
+	h_test = "Build the project for the host and run its unit tests."
+	h_test_dir = "The directory containing the test files (default: test)."
+	h_test_filter = "Only run tests with names containing this string."
+	h_test_timeout = "Seconds to allow each test program to run (default: 60)."
+
+	h_upload = "Upload the project to devices that don't already have it."
+	h_upload_device = "A device to upload to (default: the Makefile's USB_DEVICE)."
+	h_force = "Upload even if the ledger says a device is up to date."
+	h_verify = "Read back each device's flash to check whether it's up to date."
+
+	h_worker = "Compile code sent by remote executors (see the workers config option)."
+	h_worker_bind = "The address to listen on (default: 127.0.0.1)."
+	h_worker_port = "The port to listen on (default: %d)." % wrapper.default_port
+	h_worker_jobs = "The number of compiles to run at once (default: the jobs option)."
+
+	h_tune = "Find the compiler flags that make the smallest or fastest firmware."
+	h_benchmark = "A shell command that prints a score for the .hex file in $XUINO_HEX\n" \
+					"(lower is better). Without one, the smallest firmware wins."
+	h_dry_run = "Don't save the best flags to .xuino"
+
+	h_stats = "Show library build times from the build history."
+	h_stats_board = "Only show builds for this board."
+	h_stats_library = "Only show this library, and its slowest objects."
+	h_stats_limit = "The number of recent builds to show (default: 10)."
+
+	h_cache = "Export or import bundles of compiled libraries."
+	h_cache_export = "Pack the compiled library cache into a bundle."
+	h_cache_import = "Restore compatible libraries from a bundle."
+	h_bundle = "The path of the bundle (a .tar.gz file)."
+
 	# Parser for `xuino init`
 	init_parser = subparsers.add_parser("init", help = h_init)
 	init_parser.add_argument("dir", nargs = "?", default = ".", help = h_init_dir)
@@ -724,7 +2717,17 @@ def _setup_argparser():
 
 	# Parser for `xuino make`
 	make_parser = subparsers.add_parser("make", help = h_make)
-	make_parser.set_defaults(func = make)
+	make_parser.add_argument("--demand", action = "store_true", help = h_demand)
+	make_parser.add_argument("--workspace", default = None, metavar = "DIR", help = h_workspace)
+	make_parser.add_argument("--trace", default = None, metavar = "FILE", help = h_trace)
+	make_parser.set_defaults(func = _make)
+
+	# Parser for `xuino test`
+	test_parser = subparsers.add_parser("test", help = h_test)
+	test_parser.add_argument("filter", nargs = "?", default = None, help = h_test_filter)
+	test_parser.add_argument("--dir", default = "test", help = h_test_dir)
+	test_parser.add_argument("--timeout", type = int, default = 60, help = h_test_timeout)
+	test_parser.set_defaults(func = _test)
 
 	# Parser for `xuino get`
 	get_parser = subparsers.add_parser("get", help = h_get)
@@ -760,13 +2763,59 @@ def _setup_argparser():
 	lib_parser.add_argument("-l", dest = "dash_little_l", action = "store_true",
 								help = h_dash_little_l)
 	lib_parser.add_argument("-v", "--verbose", action = "store_true")
+	lib_parser.add_argument("--trace", default = None, metavar = "FILE", help = h_trace)
 	lib_parser.set_defaults(func = _get_lib)
 
+	# Parser for `xuino upload`
+	upload_parser = subparsers.add_parser("upload", help = h_upload)
+	upload_parser.add_argument("-d", "--device", action = "append", help = h_upload_device)
+	upload_parser.add_argument("-f", "--force", action = "store_true", help = h_force)
+	upload_parser.add_argument("--verify", action = "store_true", help = h_verify)
+	upload_parser.set_defaults(func = _upload)
+
+	# Parser for `xuino worker`
+	worker_parser = subparsers.add_parser("worker", help = h_worker)
+	worker_parser.add_argument("--bind", default = "127.0.0.1", help = h_worker_bind)
+	worker_parser.add_argument("--port", type = int, default = wrapper.default_port,
+								help = h_worker_port)
+	worker_parser.add_argument("--jobs", type = int, default = None, help = h_worker_jobs)
+	worker_parser.set_defaults(func = _worker)
+
+	# Parser for `xuino tune`
+	tune_parser = subparsers.add_parser("tune", help = h_tune)
+	tune_parser.add_argument("--benchmark", default = None, metavar = "COMMAND",
+								help = h_benchmark)
+	tune_parser.add_argument("-n", "--dry-run", action = "store_true", help = h_dry_run)
+	tune_parser.set_defaults(func = _tune)
+
+	# Parser for `xuino stats`
+	stats_parser = subparsers.add_parser("stats", help = h_stats)
+	stats_parser.add_argument("--board", default = None, help = h_stats_board)
+	stats_parser.add_argument("--library", default = None, help = h_stats_library)
+	stats_parser.add_argument("--limit", type = int, default = 10, help = h_stats_limit)
+	stats_parser.set_defaults(func = _stats)
+
+	# Parser for `xuino cache`
+	cache_parser = subparsers.add_parser("cache", help = h_cache)
+	cache_subparsers = cache_parser.add_subparsers()
+
+	# Parser for `xuino cache export`
+	export_parser = cache_subparsers.add_parser("export", help = h_cache_export)
+	export_parser.add_argument("bundle", help = h_bundle)
+	export_parser.set_defaults(func = _cache_export)
+
+	# Parser for `xuino cache import`
+	import_parser = cache_subparsers.add_parser("import", help = h_cache_import)
+	import_parser.add_argument("bundle", help = h_bundle)
+	import_parser.set_defaults(func = _cache_import)
+
 	return parser
 
 
-# Config initialised here upon importing
+# Config initialised here upon importing, timed for traces
+config_start = time.time()
 config = read_config()
+config_times = (config_start, time.time())
 
 
 # Main function, entry point